@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Se importa después de inicializar Django porque carga los modelos.
+from users.websocket import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # HTTP (y lifespan) van a Django; los WebSocket, al chat en tiempo real.
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -1,7 +1,10 @@
 from pathlib import Path
 from datetime import timedelta
+from importlib.util import find_spec
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.environ.get('SECRET_KEY', 'django-insecure-y_&mm&vh5ey^x&@mcwj=2^(s7i65q443u*jf29don10v9hmmi7')
@@ -79,6 +82,28 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+# Hash de contraseñas (users/hashers.py). PASSWORD_HASHER elige el preferido
+# (pbkdf2 | scrypt | argon2); los demás siguen verificando hashes antiguos, que
+# se recalculan en el siguiente login. Coste: 0 = valor por defecto de Django.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', '0'))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.environ.get('PASSWORD_SCRYPT_WORK_FACTOR', '0'))
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', '0'))
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get('PASSWORD_ARGON2_MEMORY_COST', '0'))
+
+_HASHERS = {
+    'pbkdf2': 'users.hashers.TunablePBKDF2PasswordHasher',
+    'scrypt': 'users.hashers.TunableScryptPasswordHasher',
+}
+if find_spec('argon2') is not None:
+    _HASHERS['argon2'] = 'users.hashers.TunableArgon2PasswordHasher'
+if PASSWORD_HASHER not in _HASHERS:
+    raise ImproperlyConfigured(f"PASSWORD_HASHER={PASSWORD_HASHER!r} no disponible (opciones: {', '.join(_HASHERS)})")
+PASSWORD_HASHERS = [_HASHERS[PASSWORD_HASHER]] + [h for k, h in _HASHERS.items() if k != PASSWORD_HASHER] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -91,12 +116,17 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'users.CustomUser'
 
+AUTHENTICATION_BACKENDS = [
+    'users.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 CORS_ALLOW_ALL_ORIGINS = True
 
 # ✅ JWT Configuración
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
@@ -107,8 +137,65 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Tokens con rol e ids de Driver/Passenger (users/tokens.py)
+    'TOKEN_OBTAIN_SERIALIZER': 'users.tokens.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.tokens.ClaimsTokenRefreshSerializer',
 }
 
+# Caché compartida: Redis si hay CACHE_URL (redis://...), si no locmem por proceso
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL:
+    if find_spec('redis') is None:
+        raise ImproperlyConfigured("CACHE_URL requiere el paquete redis (pip install redis)")
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'movenet',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'movenet',
+        }
+    }
+
+# Datos de referencia cacheados (users/reference.py): Policy y promociones activas
+REFERENCE_CACHE_SIZE = int(os.environ.get('REFERENCE_CACHE_SIZE', '64'))
+REFERENCE_CACHE_TTL = int(os.environ.get('REFERENCE_CACHE_TTL', '30'))
+REFERENCE_SHARED_CACHE_TTL = int(os.environ.get('REFERENCE_SHARED_CACHE_TTL', '600'))
+
+# Autenticación por claims del JWT (users/authentication.py)
+AUTH_CLAIMS_CACHE_SIZE = int(os.environ.get('AUTH_CLAIMS_CACHE_SIZE', '50000'))
+AUTH_CLAIMS_CACHE_TTL = int(os.environ.get('AUTH_CLAIMS_CACHE_TTL', '30'))
+# Vida de los access tokens con claims (rol e ids): acota cuánto dura un claim desactualizado
+AUTH_CLAIMS_ACCESS_LIFETIME = timedelta(minutes=int(os.environ.get('AUTH_CLAIMS_ACCESS_LIFETIME_MINUTES', '5')))
+
+# Tarifas (users/fares.py): base + precio por km
+FARE_BASE = float(os.environ.get('FARE_BASE', '3000'))
+FARE_PER_KM = float(os.environ.get('FARE_PER_KM', '1200'))
+FARE_QUOTE_GRID = float(os.environ.get('FARE_QUOTE_GRID', '0.001'))  # ~110 m
+FARE_QUOTE_CACHE_SIZE = int(os.environ.get('FARE_QUOTE_CACHE_SIZE', '50000'))
+FARE_QUOTE_CACHE_TTL = int(os.environ.get('FARE_QUOTE_CACHE_TTL', '600'))
+
+# Buffer de ubicaciones de conductores (users/location.py)
+LOCATION_FLUSH_INTERVAL = float(os.environ.get('LOCATION_FLUSH_INTERVAL', '2'))
+LOCATION_FLUSH_MAX_PENDING = int(os.environ.get('LOCATION_FLUSH_MAX_PENDING', '1000'))
+# Índice de conductores (users/geo.py): cada cuánto trae las posiciones volcadas
+# por otros procesos, cuándo una posición deja de contar y radio máximo de búsqueda
+DRIVER_INDEX_REFRESH_INTERVAL = float(os.environ.get('DRIVER_INDEX_REFRESH_INTERVAL', '30'))
+DRIVER_LAST_SEEN_SECONDS = int(os.environ.get('DRIVER_LAST_SEEN_SECONDS', '300'))
+NEARBY_MAX_RADIUS_KM = float(os.environ.get('NEARBY_MAX_RADIUS_KM', '10'))
+
+# Pub/sub en tiempo real (users/realtime.py); reemplazable por un backend compartido
+REALTIME_BROKER = os.environ.get('REALTIME_BROKER', 'users.realtime.InProcessBroker')
+REALTIME_POSITION_INTERVAL = float(os.environ.get('REALTIME_POSITION_INTERVAL', '3'))
+
+# Códigos de referido (users/referrals.py): no cambiar con códigos ya emitidos
+REFERRAL_CODE_KEY = os.environ.get('REFERRAL_CODE_KEY', SECRET_KEY)
+
 # Swagger config para autenticación
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
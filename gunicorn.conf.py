@@ -0,0 +1,23 @@
+import os
+
+# ✅ MODO DE SERVIDOR
+# SERVER_MODE=wsgi (por defecto): workers síncronos con backend.wsgi.
+# SERVER_MODE=asgi: workers uvicorn con backend.asgi (vistas async, WebSocket y SSE).
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+BROKER_EN_PROCESO = 'users.realtime.InProcessBroker'
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    # InProcessBroker sólo reparte dentro de su proceso: con varios workers un
+    # mensaje publicado en uno no llega a los WebSocket/SSE abiertos en otro.
+    # Con el broker por defecto se fuerza un solo worker; para escalar hay que
+    # configurar en REALTIME_BROKER un backend compartido.
+    if os.environ.get('REALTIME_BROKER', BROKER_EN_PROCESO) == BROKER_EN_PROCESO:
+        workers = 1
+else:
+    wsgi_app = 'backend.wsgi:application'
+    worker_class = 'sync'
@@ -1,9 +1,12 @@
 from django.contrib import admin
-from django.db.models import Sum
+from django.db.models import Q, Sum
+
+from .promotions import evaluate_promotions
 from .models import (
     CustomUser, Driver, Passenger, Trip, Report,
     Promotion, UserPromotion, Policy, Earning,
-    ResumenGananciasProxy, ChatMessage  # 👈 Añadido ChatMessage aquí
+    ResumenGananciasProxy, ChatMessage,  # 👈 Añadido ChatMessage aquí
+    TripTrail, EarningRollup, ReferralLink,
 )
 
 @admin.register(CustomUser)
@@ -59,6 +62,13 @@ class TripAdmin(admin.ModelAdmin):
     list_filter = ('status',)
     search_fields = ('passenger__user__username', 'driver__user__username')
 
+@admin.register(TripTrail)
+class TripTrailAdmin(admin.ModelAdmin):
+    list_display = ('trip', 'point_count', 'distance_km', 'updated_at')
+    search_fields = ('trip__id',)
+    exclude = ('data',)
+    readonly_fields = ('trip', 'point_count', 'distance_km', 'last_ts', 'last_lat_e6', 'last_lng_e6')
+
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'report_type', 'status', 'created_at')
@@ -70,6 +80,12 @@ class PromotionAdmin(admin.ModelAdmin):
     list_display = ('name', 'bonus_amount', 'start_date', 'end_date', 'target_group')
     list_filter = ('target_group',)
     search_fields = ('name',)
+    actions = ['evaluar_promociones']
+
+    @admin.action(description="Evaluar y asignar a los usuarios que cumplen los requisitos")
+    def evaluar_promociones(self, request, queryset):
+        resultado = evaluate_promotions(queryset)
+        self.message_user(request, f"{sum(resultado.values())} usuarios premiados.")
 
 @admin.register(UserPromotion)
 class UserPromotionAdmin(admin.ModelAdmin):
@@ -87,7 +103,50 @@ class EarningAdmin(admin.ModelAdmin):
     list_filter = ('earning_type',)
     search_fields = ('user__username', 'description')
 
+@admin.register(EarningRollup)
+class EarningRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'period', 'period_start', 'earning_type', 'total', 'count')
+    list_filter = ('period', 'earning_type')
+    search_fields = ('user__username',)
+
+@admin.register(ReferralLink)
+class ReferralLinkAdmin(admin.ModelAdmin):
+    list_display = ('ancestor', 'descendant', 'depth')
+    list_filter = ('depth',)
+    search_fields = ('ancestor__username', 'descendant__username')
+    raw_id_fields = ('ancestor', 'descendant')
+
+# ✅ FILTRO POR RANGO DE TOTAL GANADO
+class TotalGeneralFilter(admin.SimpleListFilter):
+    title = 'Total ganado'
+    parameter_name = 'total'
+    RANGOS = {
+        'lt50k': (None, 50000),
+        '50k-200k': (50000, 200000),
+        'gte200k': (200000, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return (
+            ('lt50k', 'Menos de $50.000'),
+            ('50k-200k', '$50.000 - $200.000'),
+            ('gte200k', '$200.000 o más'),
+        )
+
+    def queryset(self, request, queryset):
+        rango = self.RANGOS.get(self.value())
+        if rango is None:
+            return queryset
+        minimo, maximo = rango
+        if minimo is not None:
+            queryset = queryset.filter(_total_general__gte=minimo)
+        if maximo is not None:
+            queryset = queryset.filter(_total_general__lt=maximo)
+        return queryset
+
 # ✅ ADMIN DE RESUMEN DE GANANCIAS
+# Los totales salen de un único GROUP BY anotado sobre el listado, en lugar de
+# dos agregados por cada fila, y se pueden ordenar y filtrar.
 @admin.register(ResumenGananciasProxy)
 class ResumenGananciasAdmin(admin.ModelAdmin):
     list_display = (
@@ -96,29 +155,24 @@ class ResumenGananciasAdmin(admin.ModelAdmin):
         'total_general'
     )
     search_fields = ('username',)
+    list_filter = (TotalGeneralFilter,)
 
     def get_queryset(self, request):
         # Filtra usuarios que NO son superusuarios y que tienen al menos una ganancia
-        users_with_earnings = Earning.objects.values_list('user', flat=True).distinct()
-        return CustomUser.objects.filter(
-            is_superuser=False,
-            id__in=users_with_earnings
-        )
+        return CustomUser.objects.filter(is_superuser=False).annotate(
+            _total_promociones=Sum('earnings__amount', filter=Q(earnings__earning_type='promocion')),
+            _total_general=Sum('earnings__amount'),
+        ).filter(_total_general__isnull=False)
 
     def total_promociones(self, obj):
-        total = Earning.objects.filter(
-            user=obj,
-            earning_type='promocion'
-        ).aggregate(total=Sum('amount'))['total']
-        return total or 0
+        return obj._total_promociones or 0
     total_promociones.short_description = 'Total Promociones'
+    total_promociones.admin_order_field = '_total_promociones'
 
     def total_general(self, obj):
-        total = Earning.objects.filter(
-            user=obj
-        ).aggregate(total=Sum('amount'))['total']
-        return total or 0
+        return obj._total_general or 0
     total_general.short_description = 'Total Ganado'
+    total_general.admin_order_field = '_total_general'
 
 # ✅ CHAT MENSAJES
 @admin.register(ChatMessage)
@@ -0,0 +1,133 @@
+import json
+
+from django.contrib.auth import aauthenticate, get_user_model
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework.exceptions import AuthenticationFailed, NotFound
+
+from .location import location_buffer
+from .models import ChatMessage, Trip
+from .pagination import ChatMessagePagination
+from .realtime import participant_q, publish_trip_status, token_from_request, trip_for_participant, user_from_token
+from .serializers import ChatMessageSerializer, DriverLocationUpdateSerializer
+from .tokens import token_payload
+
+# ✅ VERSIONES ASYNC DE LOS ENDPOINTS MÁS USADOS (/api/async/...)
+#
+# Vistas Django async con el ORM async: bajo ASGI (SERVER_MODE=asgi) una
+# petición que espera a la base de datos no bloquea un worker. Mismas
+# respuestas que sus equivalentes DRF.
+
+
+def _json(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def _usuario(request):
+    token = token_from_request(request)
+    return await user_from_token(token) if token else None
+
+
+def _no_autenticado():
+    return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+
+# ✅ LOGIN
+@csrf_exempt
+@require_http_methods(['POST'])
+async def login_async(request):
+    data = _json(request) or {}
+    email = data.get('email')
+    password = data.get('password')
+    if not email or not password:
+        return JsonResponse({'error': 'Se requieren email y contraseña.'}, status=400)
+
+    user = await aauthenticate(request, email=email, password=password)
+    if user is not None:
+        return JsonResponse(token_payload(user), status=200)
+    if not await get_user_model().objects.filter(email=email).aexists():
+        return JsonResponse({'error': 'Correo no registrado.'}, status=404)
+    return JsonResponse({'error': 'Contraseña incorrecta.'}, status=401)
+
+
+# ✅ ACTUALIZAR UBICACIÓN DEL CONDUCTOR
+@csrf_exempt
+@require_http_methods(['POST'])
+async def update_location_async(request):
+    user = await _usuario(request)
+    if user is None:
+        return _no_autenticado()
+    serializer = DriverLocationUpdateSerializer(data=_json(request) or {})
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    conductor = await location_buffer.adriver_for_user(user.id)
+    if conductor is None:
+        return JsonResponse({'error': 'Este usuario no es un conductor.'}, status=400)
+    driver_id, is_approved = conductor
+    location_buffer.ingest(
+        driver_id,
+        serializer.validated_data['lat'],
+        serializer.validated_data['lng'],
+        is_approved=is_approved,
+    )
+    return JsonResponse({'message': 'Ubicación actualizada correctamente'})
+
+
+# ✅ CHAT DEL VIAJE: GET lista (keyset, ?cursor= / ?since=), POST envía
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+async def chat_async(request, trip_id):
+    user = await _usuario(request)
+    if user is None:
+        return _no_autenticado()
+    # Sólo el pasajero y el conductor del viaje leen o escriben su chat.
+    if await trip_for_participant(trip_id, user.id) is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+
+    if request.method == 'POST':
+        text = (_json(request) or {}).get('message')
+        if not text:
+            return JsonResponse({'error': 'Mensaje vacío'}, status=400)
+        try:
+            sender = await user.auser()
+        except AuthenticationFailed as exc:
+            return JsonResponse(exc.detail, status=401)
+        message = await ChatMessage.objects.acreate(trip_id=trip_id, sender=sender, message=text)
+        return JsonResponse(ChatMessageSerializer(message).data, status=201)
+
+    paginator = ChatMessagePagination()
+    queryset = ChatMessage.objects.filter(trip_id=trip_id).select_related('sender')
+    try:
+        page = paginator.page_queryset(queryset, request)
+    except NotFound as exc:
+        return JsonResponse({'detail': str(exc.detail)}, status=404)
+    filas = paginator.set_page([m async for m in page])
+    data = ChatMessageSerializer(filas, many=True).data
+    return JsonResponse(paginator.get_paginated_data(data))
+
+
+# ✅ ACTUALIZAR ESTADO DEL VIAJE
+@csrf_exempt
+@require_http_methods(['PATCH', 'PUT'])
+async def trip_status_async(request, pk):
+    user = await _usuario(request)
+    if user is None:
+        return _no_autenticado()
+    status = (_json(request) or {}).get('status')
+    if status not in dict(Trip.STATUS_CHOICES):
+        return JsonResponse({'status': ['Estado inválido.']}, status=400)
+
+    # Una sola escritura, sólo si quien la pide es pasajero o conductor del viaje.
+    viaje = Trip.objects.filter(participant_q(user.id), pk=pk)
+    if not await viaje.aupdate(status=status, updated_at=timezone.now()):
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    driver_id = await Trip.objects.filter(pk=pk).values_list('driver_id', flat=True).afirst()
+    publish_trip_status(pk, status, driver_id, on_commit=False)
+    return JsonResponse({'status': status})
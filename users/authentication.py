@@ -0,0 +1,149 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import LRUCache
+
+# ✅ AUTENTICACIÓN JWT SIN CONSULTA POR PETICIÓN
+#
+# Los tokens emitidos por la app llevan el rol y los ids de Driver/Passenger
+# como claims firmados; ClaimsJWTAuthentication construye un ClaimsUser a
+# partir de ellos sin tocar la base de datos. Los tokens antiguos (sin claims)
+# se completan con una caché LRU por proceso de AUTH_CLAIMS_CACHE_TTL segundos.
+# Los claims valen lo que dure el access token, que para estos tokens es corto
+# (AUTH_CLAIMS_ACCESS_LIFETIME, ver users/tokens.py): al refrescar se releen de
+# la base de datos. Además, desactivar o borrar un usuario, o quitarle el rol,
+# revoca en este proceso los tokens emitidos antes (revoke_user).
+
+claims_cache = LRUCache('auth_claims', maxsize=settings.AUTH_CLAIMS_CACHE_SIZE, ttl=settings.AUTH_CLAIMS_CACHE_TTL)
+users_cache = LRUCache('auth_users', maxsize=settings.AUTH_CLAIMS_CACHE_SIZE, ttl=settings.AUTH_CLAIMS_CACHE_TTL)
+revoked_cache = LRUCache(
+    'auth_revoked',
+    maxsize=settings.AUTH_CLAIMS_CACHE_SIZE,
+    ttl=settings.AUTH_CLAIMS_ACCESS_LIFETIME.total_seconds(),
+)
+
+
+def role_for(driver_id, passenger_id):
+    if driver_id is not None:
+        return 'conductor'
+    if passenger_id is not None:
+        return 'pasajero'
+    return 'desconocido'
+
+
+def user_claims(user):
+    """Claims de ``user`` (conviene cargarlo con select_related('driver', 'passenger'))."""
+    driver = getattr(user, 'driver', None)
+    passenger = getattr(user, 'passenger', None)
+    driver_id = driver.id if driver is not None else None
+    passenger_id = passenger.id if passenger is not None else None
+    return {
+        'username': user.username,
+        'role': role_for(driver_id, passenger_id),
+        'driver_id': driver_id,
+        'passenger_id': passenger_id,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+    }
+
+
+def load_claims(user_id):
+    fila = get_user_model().objects.filter(pk=user_id, is_active=True).values(
+        'username', 'is_staff', 'is_superuser', 'driver__id', 'passenger__id',
+    ).first()
+    if fila is None:
+        return None
+    driver_id = fila.pop('driver__id')
+    passenger_id = fila.pop('passenger__id')
+    return {**fila, 'role': role_for(driver_id, passenger_id), 'driver_id': driver_id, 'passenger_id': passenger_id}
+
+
+def _usuarios_activos():
+    return get_user_model().objects.select_related('driver', 'passenger').filter(is_active=True)
+
+
+def _cargar_usuario(user_id):
+    return _usuarios_activos().filter(pk=user_id).first()
+
+
+def _usuario_no_encontrado():
+    return AuthenticationFailed("Usuario no encontrado o inactivo.", code='user_not_found')
+
+
+def forget_user(user_id):
+    # Invalida las cachés de este proceso (cambios de rol, staff, borrado...).
+    claims_cache.delete(user_id)
+    users_cache.delete(user_id)
+
+
+def revoke_user(user_id):
+    # Los tokens con claims emitidos antes de este instante dejan de valer en
+    # este proceso (en los demás caducan solos en AUTH_CLAIMS_ACCESS_LIFETIME).
+    forget_user(user_id)
+    revoked_cache.set(user_id, int(time.time()))
+
+
+def is_revoked(user_id, issued_at):
+    revocado = revoked_cache.get(user_id)
+    return revocado is not None and (issued_at or 0) < revocado
+
+
+class ClaimsUser(TokenUser):
+    @cached_property
+    def role(self):
+        return self.token.get('role', 'desconocido')
+
+    @cached_property
+    def driver_id(self):
+        return self.token.get('driver_id')
+
+    @cached_property
+    def passenger_id(self):
+        return self.token.get('passenger_id')
+
+    @cached_property
+    def user(self):
+        # Modelo completo, sólo para los casos que lo necesitan (caché por proceso).
+        # AuthenticationFailed si el usuario ya no existe o está inactivo.
+        user = users_cache.get_or_set(self.id, lambda: _cargar_usuario(self.id))
+        if user is None:
+            raise _usuario_no_encontrado()
+        return user
+
+    async def auser(self):
+        user = users_cache.get(self.id)
+        if user is None:
+            user = await _usuarios_activos().filter(pk=self.id).afirst()
+            users_cache.set(self.id, user)
+        if user is None:
+            raise _usuario_no_encontrado()
+        return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    @staticmethod
+    def has_claims(validated_token):
+        return 'role' in validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise AuthenticationFailed("El token no contiene identificación de usuario.", code='token_not_valid')
+
+        if self.has_claims(validated_token):
+            if is_revoked(user_id, validated_token.get('iat')):
+                raise AuthenticationFailed("El token fue revocado.", code='token_not_valid')
+            return ClaimsUser(validated_token)
+
+        claims = claims_cache.get_or_set(user_id, lambda: load_claims(user_id))
+        if claims is None:
+            raise _usuario_no_encontrado()
+        return ClaimsUser({**validated_token.payload, **claims})
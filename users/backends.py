@@ -0,0 +1,47 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+# ✅ LOGIN POR EMAIL
+#
+# Busca al usuario por el índice único de email y trae Driver/Passenger en la
+# misma consulta (select_related), así el rol se resuelve sin más viajes a la
+# base de datos. El ModelBackend por username sigue activo para el admin.
+
+
+class EmailBackend(ModelBackend):
+    def get_user_by_email(self, email):
+        User = get_user_model()
+        try:
+            return User.objects.select_related('driver', 'passenger').get(email=email)
+        except User.DoesNotExist:
+            return None
+
+    async def aget_user_by_email(self, email):
+        User = get_user_model()
+        try:
+            return await User.objects.select_related('driver', 'passenger').aget(email=email)
+        except User.DoesNotExist:
+            return None
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if not email or password is None:
+            return None
+        user = self.get_user_by_email(email)
+        if user is None:
+            # Igual que ModelBackend: calcula un hash para no delatar por tiempo qué emails existen.
+            get_user_model()().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, email=None, password=None, **kwargs):
+        if not email or password is None:
+            return None
+        user = await self.aget_user_by_email(email)
+        if user is None:
+            get_user_model()().set_password(password)
+            return None
+        if await user.acheck_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
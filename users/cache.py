@@ -0,0 +1,169 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+# ✅ CACHÉ LRU CON TTL EN MEMORIA DEL PROCESO
+#
+# Acotada por número de entradas; cada entrada expira a los ``ttl`` segundos.
+# Todas las instancias con nombre quedan registradas para exponer sus métricas
+# de aciertos y fallos (ver cache_stats()).
+
+_MISSING = object()
+_registry = {}
+
+
+class LRUCache:
+    def __init__(self, name, maxsize=1024, ttl=60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        ahora = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires = entry
+                if expires > ahora:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key, factory, ttl=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
+
+
+# ✅ SEGUNDO NIVEL COMPARTIDO (CACHES de settings: Redis o locmem)
+#
+# SharedCache envuelve un alias de django.core.cache con prefijo y métricas; si
+# el backend falla (Redis caído) cuenta el error y se comporta como un fallo de
+# caché. TieredCache consulta primero la LRU del proceso y después la
+# compartida: al invalidar se borran ambas, pero la LRU de los demás procesos
+# sólo se entera al expirar, así que su TTL debe ser corto.
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache:
+    def __init__(self, name, alias='default', ttl=300):
+        self.name = name
+        self.alias = alias
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        _registry[name] = self
+
+    def _key(self, key):
+        return f'{self.name}:{key}'
+
+    def _fallo(self, operacion):
+        self.errors += 1
+        logger.warning("Caché compartida %s no disponible (%s)", self.name, operacion, exc_info=True)
+
+    def get(self, key, default=None):
+        try:
+            value = caches[self.alias].get(self._key(key), _MISSING)
+        except Exception:
+            self._fallo('get')
+            value = _MISSING
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        try:
+            caches[self.alias].set(self._key(key), value, ttl if ttl is not None else self.ttl)
+        except Exception:
+            self._fallo('set')
+
+    def delete(self, key):
+        try:
+            caches[self.alias].delete(self._key(key))
+        except Exception:
+            self._fallo('delete')
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': caches[self.alias].__class__.__name__,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
+
+
+class TieredCache:
+    def __init__(self, name, maxsize=1024, ttl=30, shared_ttl=300, alias='default'):
+        self.local = LRUCache(f'{name}_local', maxsize=maxsize, ttl=ttl)
+        self.shared = SharedCache(f'{name}_shared', alias=alias, ttl=shared_ttl)
+
+    def get_or_set(self, key, factory):
+        value = self.local.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.shared.get(key, _MISSING)
+            if value is _MISSING:
+                value = factory()
+                self.shared.set(key, value)
+            self.local.set(key, value)
+        return value
+
+    def delete(self, key):
+        self.local.delete(key)
+        self.shared.delete(key)
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in _registry.items()}
@@ -0,0 +1,121 @@
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .geo import DriverSpatialIndex
+from .models import Driver, Trip
+from .realtime import publish_trip_status
+
+# ✅ MOTOR DE DESPACHO AUTOMÁTICO
+#
+# En cada tick se toman los viajes pendientes sin conductor y los conductores
+# aprobados y libres, y se resuelve la asignación en lote: cada viaje propone sus
+# candidatos más cercanos (índice espacial) y las parejas se aceptan de menor a
+# mayor distancia mientras viaje y conductor sigan libres (greedy global).
+# Las filas de los conductores se bloquean tanto en el tick como en la
+# asignación manual (claim_trip), así un conductor nunca recibe dos viajes.
+
+ESTADOS_OCUPADO = ('assigned', 'in_progress')
+CANDIDATOS_POR_VIAJE = 8
+RADIO_MAXIMO_KM = 10
+MAX_VIAJES_POR_TICK = 1000
+
+
+def _ocupado(driver_ref):
+    return Exists(Trip.objects.filter(driver_id=driver_ref, status__in=ESTADOS_OCUPADO))
+
+
+def claim_trip(trip_id, driver_id):
+    # UPDATE condicional: sólo gana quien encuentra el viaje aún pendiente y sin
+    # conductor, y al conductor sin otro viaje activo. La fila del conductor se
+    # bloquea antes para no cruzarse con un tick del despachador.
+    with transaction.atomic():
+        Driver.objects.select_for_update().filter(pk=driver_id).values_list('pk', flat=True).first()
+        return Trip.objects.filter(
+            ~_ocupado(driver_id),
+            id=trip_id,
+            driver__isnull=True,
+            status='pending',
+        ).update(driver_id=driver_id, status='assigned', updated_at=timezone.now()) == 1
+
+
+def idle_drivers():
+    # Aprobados, con posición reciente (DRIVER_LAST_SEEN_SECONDS) y sin viaje activo.
+    visto_desde = timezone.now() - timedelta(seconds=settings.DRIVER_LAST_SEEN_SECONDS)
+    return (
+        Driver.objects.filter(
+            is_approved=True,
+            current_lat__isnull=False,
+            current_lng__isnull=False,
+            location_updated_at__gte=visto_desde,
+        )
+        .exclude(_ocupado(OuterRef('pk')))
+        .values_list('id', 'current_lat', 'current_lng')
+    )
+
+
+def match_trips(trips, drivers, radius_km=RADIO_MAXIMO_KM, candidates=CANDIDATOS_POR_VIAJE):
+    """Empareja ``trips`` [(id, lat, lng)] con ``drivers`` [(id, lat, lng)] y devuelve {trip_id: driver_id}."""
+    index = DriverSpatialIndex()
+    for driver_id, lat, lng in drivers:
+        index.upsert(driver_id, lat, lng)
+
+    parejas = []
+    for trip_id, lat, lng in trips:
+        for driver_id, dist, _, _ in index.nearest(lat, lng, k=candidates, radius_km=radius_km):
+            parejas.append((dist, trip_id, driver_id))
+    heapq.heapify(parejas)
+
+    asignaciones = {}
+    ocupados = set()
+    while parejas and len(ocupados) < len(index):
+        _, trip_id, driver_id = heapq.heappop(parejas)
+        if trip_id in asignaciones or driver_id in ocupados:
+            continue
+        asignaciones[trip_id] = driver_id
+        ocupados.add(driver_id)
+    return asignaciones
+
+
+def run_dispatch_tick(limit=MAX_VIAJES_POR_TICK, radius_km=RADIO_MAXIMO_KM):
+    # Todo el tick va en una transacción: los viajes pendientes se bloquean
+    # (saltando los que otro despachador ya tiene) y se escriben con un solo bulk_update.
+    with transaction.atomic():
+        trips = list(
+            Trip.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', driver__isnull=True)
+            .order_by('created_at')
+            .only('id', 'origin_lat', 'origin_lng', 'driver', 'status', 'updated_at')[:limit]
+        )
+        if not trips:
+            return {}
+
+        # Conductores bloqueados (saltando los que una asignación manual u otro
+        # tick tiene tomados) hasta el final de la transacción.
+        conductores = list(idle_drivers().select_for_update(skip_locked=True, of=('self',)))
+        asignaciones = match_trips(
+            [(t.id, t.origin_lat, t.origin_lng) for t in trips],
+            conductores,
+            radius_km=radius_km,
+        )
+        if not asignaciones:
+            return {}
+
+        ahora = timezone.now()
+        asignados = []
+        for trip in trips:
+            driver_id = asignaciones.get(trip.id)
+            if driver_id is None:
+                continue
+            trip.driver_id = driver_id
+            trip.status = 'assigned'
+            trip.updated_at = ahora
+            asignados.append(trip)
+        Trip.objects.bulk_update(asignados, ['driver', 'status', 'updated_at'])
+        for trip in asignados:
+            publish_trip_status(trip.id, trip.status, trip.driver_id)
+    return asignaciones
@@ -0,0 +1,150 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncWeek
+from django.utils import timezone
+
+# ✅ ACUMULADOS DE GANANCIAS POR PERIODO (día / semana)
+#
+# EarningRollup guarda, por usuario, periodo y tipo de ganancia, el total y el
+# número de ganancias. Se mantiene de forma incremental al crear, editar o
+# borrar un Earning (apply_rollups; al editar se resta la fila anterior y se
+# suma la nueva) y se puede recalcular desde cero con rebuild_rollups() /
+# `manage.py rollup_earnings`. Las filas que se quedan sin ganancias se borran.
+
+PERIODOS = ('day', 'week')
+TRUNCADORES = {'day': TruncDay, 'week': TruncWeek}
+
+
+def period_start(dt, period):
+    fecha = timezone.localdate(dt) if timezone.is_aware(dt) else dt.date()
+    if period == 'week':
+        return fecha - timedelta(days=fecha.weekday())
+    return fecha
+
+
+def apply_rollups(earnings, sign=1):
+    """Suma (sign=1) o resta (sign=-1) ``earnings`` en los acumulados de cada periodo."""
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for earning in earnings:
+        for period in PERIODOS:
+            key = (earning.user_id, period, period_start(earning.created_at, period), earning.earning_type)
+            deltas[key][0] += Decimal(earning.amount) * sign
+            deltas[key][1] += sign
+    if len(deltas) > len(PERIODOS):
+        try:
+            return _apply_rollups_bulk(deltas, crear=sign > 0)
+        except IntegrityError:
+            pass  # otro proceso creó alguna fila: se repite fila a fila
+    _apply_rollups_each(deltas, crear=sign > 0)
+
+
+def _apply_rollups_each(deltas, crear):
+    from .models import EarningRollup
+
+    for (user_id, period, inicio, earning_type), (total, count) in deltas.items():
+        filtro = dict(user_id=user_id, period=period, period_start=inicio, earning_type=earning_type)
+        cambios = dict(total=F('total') + total, count=F('count') + count)
+        if EarningRollup.objects.filter(**filtro).update(**cambios) or not crear:
+            # Al restar nunca se crean filas (p. ej. durante el borrado en cascada de un usuario).
+            if count < 0:
+                EarningRollup.objects.filter(count__lte=0, **filtro).delete()
+            continue
+        try:
+            with transaction.atomic():
+                EarningRollup.objects.create(total=total, count=count, **filtro)
+        except IntegrityError:
+            # Otro proceso creó la fila entre el UPDATE y el INSERT.
+            EarningRollup.objects.filter(**filtro).update(**cambios)
+
+
+def _apply_rollups_bulk(deltas, crear):
+    # Para lotes (evaluación de promociones): una lectura con bloqueo, un
+    # bulk_update y un bulk_create en lugar de una consulta por fila.
+    from .models import EarningRollup
+
+    with transaction.atomic():
+        existentes = EarningRollup.objects.select_for_update().filter(
+            user_id__in={k[0] for k in deltas},
+            period_start__in={k[2] for k in deltas},
+        )
+        cambiados = []
+        pendientes = dict(deltas)
+        for rollup in existentes:
+            delta = pendientes.pop((rollup.user_id, rollup.period, rollup.period_start, rollup.earning_type), None)
+            if delta is not None:
+                rollup.total += delta[0]
+                rollup.count += delta[1]
+                cambiados.append(rollup)
+        vacios = [r.pk for r in cambiados if r.count <= 0]
+        if vacios:
+            EarningRollup.objects.filter(pk__in=vacios).delete()
+        EarningRollup.objects.bulk_update(
+            [r for r in cambiados if r.count > 0], ['total', 'count'], batch_size=1000,
+        )
+        if crear:
+            EarningRollup.objects.bulk_create([
+                EarningRollup(
+                    user_id=user_id, period=period, period_start=inicio,
+                    earning_type=earning_type, total=total, count=count,
+                )
+                for (user_id, period, inicio, earning_type), (total, count) in pendientes.items()
+            ], batch_size=1000)
+
+
+def rebuild_rollups(user_ids=None, batch_size=1000):
+    # Recalcula los acumulados desde Earning con un GROUP BY por periodo.
+    from .models import Earning, EarningRollup
+
+    earnings = Earning.objects.all()
+    rollups = EarningRollup.objects.all()
+    if user_ids is not None:
+        earnings = earnings.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    total_filas = 0
+    with transaction.atomic():
+        rollups.delete()
+        for period in PERIODOS:
+            filas = (
+                earnings.annotate(inicio=TRUNCADORES[period]('created_at'))
+                .values('user_id', 'earning_type', 'inicio')
+                .annotate(total=Sum('amount'), count=Count('id'))
+                .order_by()
+            )
+            nuevos = [
+                EarningRollup(
+                    user_id=fila['user_id'],
+                    period=period,
+                    period_start=period_start(fila['inicio'], period),
+                    earning_type=fila['earning_type'],
+                    total=fila['total'],
+                    count=fila['count'],
+                )
+                for fila in filas.iterator(chunk_size=batch_size)
+            ]
+            EarningRollup.objects.bulk_create(nuevos, batch_size=batch_size)
+            total_filas += len(nuevos)
+    return total_filas
+
+
+def period_history(user_id, period='week', limit=12):
+    """Devuelve los últimos ``limit`` periodos del usuario con su total, conteo y desglose por tipo."""
+    from .models import Earning, EarningRollup
+
+    tipos = len(Earning.EARNING_TYPE_CHOICES)
+    filas = (
+        EarningRollup.objects.filter(user_id=user_id, period=period)
+        .order_by('-period_start')
+        .values_list('period_start', 'earning_type', 'total', 'count')[:limit * tipos]
+    )
+    periodos = {}
+    for inicio, earning_type, total, count in filas:
+        item = periodos.setdefault(inicio, {'period_start': inicio, 'total': Decimal('0'), 'count': 0, 'by_type': {}})
+        item['total'] += total
+        item['count'] += count
+        item['by_type'][earning_type] = total
+    return list(periodos.values())[:limit]
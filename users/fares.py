@@ -0,0 +1,103 @@
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+from .cache import LRUCache
+from .geo import RADIO_TIERRA_KM, haversine_km
+
+# ✅ CÁLCULO DE TARIFAS
+#
+# Tarifa = base + km en línea recta (haversine) * precio por km. Los valores se
+# configuran con FARE_BASE / FARE_PER_KM en settings. compute_fares() calcula
+# miles de tarifas en una sola llamada vectorizada con NumPy.
+
+# Las cotizaciones se redondean a una cuadrícula de FARE_QUOTE_GRID grados y se
+# guardan en una caché LRU/TTL, porque los pasajeros repiten el mismo trayecto.
+fare_quote_cache = LRUCache(
+    'fare_quotes',
+    maxsize=settings.FARE_QUOTE_CACHE_SIZE,
+    ttl=settings.FARE_QUOTE_CACHE_TTL,
+)
+
+
+def get_tariff(base=None, per_km=None):
+    return (
+        base if base is not None else settings.FARE_BASE,
+        per_km if per_km is not None else settings.FARE_PER_KM,
+    )
+
+
+def haversine_km_vec(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(a))
+
+
+def compute_fare(origin_lat, origin_lng, destination_lat, destination_lng, base=None, per_km=None):
+    if None in (origin_lat, origin_lng, destination_lat, destination_lng):
+        return None
+    base, per_km = get_tariff(base, per_km)
+    distancia_km = haversine_km(origin_lat, origin_lng, destination_lat, destination_lng)
+    return Decimal(str(round(base + distancia_km * per_km, 2)))
+
+
+def compute_fares(origin_lat, origin_lng, destination_lat, destination_lng, base=None, per_km=None):
+    """Versión vectorizada: recibe arreglos de coordenadas y devuelve un arreglo de tarifas redondeadas."""
+    base, per_km = get_tariff(base, per_km)
+    distancias = haversine_km_vec(origin_lat, origin_lng, destination_lat, destination_lng)
+    return np.round(base + distancias * per_km, 2)
+
+
+def reprice_trips(queryset, base=None, per_km=None, batch_size=1000):
+    # Recalcula y guarda la tarifa de todos los viajes del queryset en lotes,
+    # con una sola llamada vectorizada por lote.
+    from .models import Trip
+
+    qs = queryset.filter(
+        origin_lat__isnull=False, origin_lng__isnull=False,
+        destination_lat__isnull=False, destination_lng__isnull=False,
+    ).only('id', 'origin_lat', 'origin_lng', 'destination_lat', 'destination_lng', 'fare').order_by('id')
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        lote = list(qs.filter(id__gt=ultimo_id)[:batch_size])
+        if not lote:
+            return total
+        coords = np.array(
+            [(t.origin_lat, t.origin_lng, t.destination_lat, t.destination_lng) for t in lote],
+            dtype=np.float64,
+        )
+        tarifas = compute_fares(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3], base, per_km)
+        for trip, tarifa in zip(lote, tarifas):
+            trip.fare = Decimal(str(tarifa))
+        Trip.objects.bulk_update(lote, ['fare'])
+        total += len(lote)
+        ultimo_id = lote[-1].id
+
+
+def _snap(value, grid):
+    return round(round(value / grid) * grid, 6)
+
+
+def quote_fares(routes, base=None, per_km=None):
+    """Cotiza ``routes`` [(origin_lat, origin_lng, destination_lat, destination_lng)] sin escribir en la base de datos.
+
+    Devuelve una lista de (tarifa, distancia_km) en el mismo orden. Las rutas que
+    no están en caché se calculan juntas en una sola llamada vectorizada.
+    """
+    base, per_km = get_tariff(base, per_km)
+    grid = settings.FARE_QUOTE_GRID
+    keys = [(base, per_km) + tuple(_snap(v, grid) for v in route) for route in routes]
+    resultados = [fare_quote_cache.get(key) for key in keys]
+
+    faltantes = [i for i, r in enumerate(resultados) if r is None]
+    if faltantes:
+        coords = np.array([keys[i][2:] for i in faltantes], dtype=np.float64)
+        distancias = haversine_km_vec(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+        tarifas = np.round(base + distancias * per_km, 2)
+        for i, distancia, tarifa in zip(faltantes, distancias, tarifas):
+            resultados[i] = (Decimal(str(tarifa)), round(float(distancia), 3))
+            fare_quote_cache.set(keys[i], resultados[i])
+    return resultados
@@ -0,0 +1,272 @@
+import heapq
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# ✅ ÍNDICE ESPACIAL EN MEMORIA PARA CONDUCTORES CERCANOS
+#
+# Cuadrícula de celdas de tamaño fijo (en grados) que se mantiene al día en cada
+# escritura de ubicación. Una búsqueda recorre anillos de celdas alrededor del
+# origen y sólo calcula haversine para los conductores de esas celdas.
+# Cada entrada guarda cuándo se vio al conductor (epoch); las búsquedas ignoran
+# las posiciones más antiguas que DRIVER_LAST_SEEN_SECONDS.
+
+RADIO_TIERRA_KM = 6371
+KM_POR_GRADO = 111.32
+TAMANO_CELDA_GRADOS = 0.01  # ~1.1 km de lado en latitud
+MAX_ANILLOS = 100
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(math.sqrt(a))
+
+
+class DriverSpatialIndex:
+    def __init__(self, cell_size=TAMANO_CELDA_GRADOS):
+        self.cell_size = cell_size
+        self._cells = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, driver_id):
+        return driver_id in self._positions
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    def upsert(self, driver_id, lat, lng, seen=None):
+        cell = self._cell(lat, lng)
+        with self._lock:
+            anterior = self._positions.get(driver_id)
+            if anterior is not None and anterior[2] != cell:
+                self._discard_from_cell(driver_id, anterior[2])
+            self._positions[driver_id] = (lat, lng, cell, seen)
+            self._cells.setdefault(cell, {})[driver_id] = (lat, lng, seen)
+
+    def seen(self, driver_id):
+        pos = self._positions.get(driver_id)
+        return pos[3] if pos is not None else None
+
+    def prune(self, seen_before):
+        # Quita los conductores vistos antes de ``seen_before`` (o sin marca de tiempo).
+        with self._lock:
+            viejos = [d for d, pos in self._positions.items() if pos[3] is None or pos[3] < seen_before]
+            for driver_id in viejos:
+                self._discard_from_cell(driver_id, self._positions.pop(driver_id)[2])
+        return len(viejos)
+
+    def remove(self, driver_id):
+        with self._lock:
+            anterior = self._positions.pop(driver_id, None)
+            if anterior is not None:
+                self._discard_from_cell(driver_id, anterior[2])
+
+    def _discard_from_cell(self, driver_id, cell):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(driver_id, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def position(self, driver_id):
+        pos = self._positions.get(driver_id)
+        return (pos[0], pos[1]) if pos is not None else None
+
+    def nearest(self, lat, lng, k=5, radius_km=None, exclude=None, seen_after=None):
+        """Devuelve hasta ``k`` tuplas ``(driver_id, distancia_km, lat, lng)`` ordenadas por distancia.
+
+        Con ``seen_after`` se ignoran los conductores vistos antes de ese epoch.
+        """
+        if radius_km is not None and math.isinf(radius_km) and radius_km > 0:
+            radius_km = None
+        if k <= 0 or (radius_km is not None and not radius_km >= 0):  # también descarta NaN
+            return []
+        cx, cy = self._cell(lat, lng)
+        # Cota inferior de la distancia a cualquier punto del anillo r: (r - 1) celdas
+        # completas en el lado más corto de la celda (la longitud se encoge con la latitud).
+        lado_km = self.cell_size * KM_POR_GRADO * max(math.cos(math.radians(lat)), 0.01)
+        if radius_km is not None:
+            max_anillo = min(MAX_ANILLOS, int(radius_km / lado_km) + 1)
+        else:
+            max_anillo = MAX_ANILLOS
+        if not self._positions:
+            return []
+
+        mejores = []  # heap máximo por distancia (distancias negadas)
+        with self._lock:
+            for r in range(max_anillo + 1):
+                cota = (r - 1) * lado_km
+                if radius_km is not None and cota > radius_km:
+                    break
+                if len(mejores) == k and cota > -mejores[0][0]:
+                    break
+                for cell in self._ring(cx, cy, r):
+                    bucket = self._cells.get(cell)
+                    if not bucket:
+                        continue
+                    for driver_id, (dlat, dlng, visto) in bucket.items():
+                        if exclude and driver_id in exclude:
+                            continue
+                        if seen_after is not None and (visto is None or visto < seen_after):
+                            continue
+                        dist = haversine_km(lat, lng, dlat, dlng)
+                        if radius_km is not None and dist > radius_km:
+                            continue
+                        item = (-dist, driver_id, dlat, dlng)
+                        if len(mejores) < k:
+                            heapq.heappush(mejores, item)
+                        elif dist < -mejores[0][0]:
+                            heapq.heapreplace(mejores, item)
+
+        return sorted(
+            ((driver_id, -neg_dist, dlat, dlng) for neg_dist, driver_id, dlat, dlng in mejores),
+            key=lambda item: item[1],
+        )
+
+    @staticmethod
+    def _ring(cx, cy, r):
+        if r == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-r, r + 1):
+            yield (cx + dx, cy - r)
+            yield (cx + dx, cy + r)
+        for dy in range(-r + 1, r):
+            yield (cx - r, cy + dy)
+            yield (cx + r, cy + dy)
+
+
+_driver_index = None
+_driver_index_lock = threading.Lock()
+_refresh_thread = None
+
+
+def _epoch(dt):
+    return dt.timestamp() if dt is not None else None
+
+
+def epoch_to_datetime(ts):
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+
+
+def _vigente_desde():
+    return time.time() - settings.DRIVER_LAST_SEEN_SECONDS
+
+
+def _build_driver_index():
+    from .location import location_buffer
+    from .models import Driver
+
+    index = DriverSpatialIndex()
+    pendientes = location_buffer.pending_positions()
+    rows = Driver.objects.filter(
+        is_approved=True,
+        current_lat__isnull=False,
+        location_updated_at__gte=epoch_to_datetime(_vigente_desde()),
+    ).values_list('id', 'current_lat', 'current_lng', 'location_updated_at')
+    for driver_id, lat, lng, visto in rows.iterator(chunk_size=5000):
+        index.upsert(driver_id, lat, lng, _epoch(visto))
+    # Pings aún sin volcar (más recientes que la fila), sólo de conductores aprobados.
+    aprobados = Driver.objects.filter(is_approved=True, id__in=list(pendientes)).values_list('id', flat=True)
+    for driver_id in aprobados:
+        lat, lng, ts = pendientes[driver_id]
+        index.upsert(driver_id, lat, lng, ts)
+    return index
+
+
+def get_driver_index():
+    # Se construye una vez por proceso (sólo con posiciones recientes) y se
+    # mantiene con cada actualización de ubicación o cambio del conductor. Un
+    # hilo en segundo plano trae cada DRIVER_INDEX_REFRESH_INTERVAL segundos
+    # las posiciones que otros procesos volcaron y quita las caducadas, sin
+    # reconstruir el índice en el camino de una petición.
+    global _driver_index
+    if _driver_index is None:
+        with _driver_index_lock:
+            if _driver_index is None:
+                _driver_index = _build_driver_index()
+                _start_refresh()
+    return _driver_index
+
+
+def refresh_driver_index(since):
+    """Aplica las posiciones volcadas desde ``since`` (epoch) y poda las caducadas; devuelve cuántas aplicó."""
+    from .models import Driver
+
+    index = _driver_index
+    if index is None:
+        return 0
+    aplicadas = 0
+    rows = Driver.objects.filter(
+        is_approved=True,
+        current_lat__isnull=False,
+        location_updated_at__gte=epoch_to_datetime(since),
+    ).values_list('id', 'current_lat', 'current_lng', 'location_updated_at')
+    for driver_id, lat, lng, visto in rows.iterator(chunk_size=5000):
+        visto = _epoch(visto)
+        actual = index.seen(driver_id)
+        if actual is None or visto > actual:
+            index.upsert(driver_id, lat, lng, visto)
+            aplicadas += 1
+    index.prune(_vigente_desde())
+    return aplicadas
+
+
+def _refresh_loop():
+    desde = time.time()
+    while True:
+        time.sleep(settings.DRIVER_INDEX_REFRESH_INTERVAL)
+        # Margen: una fila volcada justo antes de la consulta anterior no se pierde.
+        siguiente = time.time() - settings.DRIVER_INDEX_REFRESH_INTERVAL
+        close_old_connections()
+        try:
+            refresh_driver_index(desde)
+            desde = siguiente
+        except Exception:
+            logger.exception("No se pudo refrescar el índice de conductores")
+
+
+def _start_refresh():
+    global _refresh_thread
+    if settings.DRIVER_INDEX_REFRESH_INTERVAL > 0 and _refresh_thread is None:
+        _refresh_thread = threading.Thread(target=_refresh_loop, name='driver-index-refresh', daemon=True)
+        _refresh_thread.start()
+
+
+def sync_driver(driver_id, is_approved, lat, lng, seen=None):
+    index = _driver_index
+    if index is None:
+        # Si se está construyendo se espera a que termine; si aún no se ha
+        # cargado no hay nada que mantener (la carga leerá el buffer).
+        with _driver_index_lock:
+            index = _driver_index
+        if index is None:
+            return
+    if is_approved and lat is not None and lng is not None:
+        index.upsert(driver_id, lat, lng, seen)
+    else:
+        index.remove(driver_id)
+
+
+def nearest_drivers(lat, lng, k=5, radius_km=None, exclude=None):
+    # Sin radio (o con uno mayor) se busca hasta NEARBY_MAX_RADIUS_KM: así una
+    # búsqueda lejos de todo conductor no recorre los MAX_ANILLOS anillos.
+    tope = settings.NEARBY_MAX_RADIUS_KM
+    radius_km = tope if radius_km is None else min(radius_km, tope)
+    return get_driver_index().nearest(
+        lat, lng, k=k, radius_km=radius_km, exclude=exclude, seen_after=_vigente_desde(),
+    )
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+
+# ✅ HASHERS DE CONTRASEÑA CON COSTE CONFIGURABLE
+#
+# Mismo algoritmo y formato que los de Django, pero el coste se lee de
+# settings (PASSWORD_PBKDF2_ITERATIONS, PASSWORD_SCRYPT_WORK_FACTOR,
+# PASSWORD_ARGON2_*) para ajustarlo por entorno. Si el coste cambia, o cambia
+# el hasher preferido (PASSWORD_HASHER), Django vuelve a calcular el hash en
+# el siguiente login correcto (must_update), sin migración de datos.
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+
+class TunableScryptPasswordHasher(ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR or ScryptPasswordHasher.work_factor
+
+
+class TunableArgon2PasswordHasher(Argon2PasswordHasher):
+    # Requiere argon2-cffi (opcional, no está en requirements.txt).
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST or Argon2PasswordHasher.time_cost
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST or Argon2PasswordHasher.memory_cost
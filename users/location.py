@@ -0,0 +1,167 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import geo, realtime
+
+logger = logging.getLogger(__name__)
+
+# ✅ BUFFER DE UBICACIONES DE CONDUCTORES
+#
+# Cada ping sólo actualiza la última posición en memoria (y el índice espacial).
+# Un hilo en segundo plano vuelca las posiciones modificadas a
+# Driver.current_lat/current_lng con bulk_update cada LOCATION_FLUSH_INTERVAL
+# segundos, o antes si se acumulan LOCATION_FLUSH_MAX_PENDING conductores.
+# Es el sustituto local de un almacén compartido tipo Redis.
+#
+# Buffer e índice espacial son por proceso: un ping se ve al instante sólo en
+# el worker que lo recibió. Los demás workers lo ven cuando su índice trae las
+# posiciones volcadas (DRIVER_INDEX_REFRESH_INTERVAL en settings), es decir,
+# con el retraso del volcado más el de ese refresco.
+
+TTL_CONDUCTOR = 60  # segundos que se recuerda user_id -> (driver_id, is_approved)
+
+
+class LocationBuffer:
+    def __init__(self, flush_interval=2.0, max_pending=1000, batch_size=500):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._latest = {}
+        self._dirty = set()
+        self._drivers = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def _cached_driver(self, user_id):
+        entry = self._drivers.get(user_id)
+        if entry is not None and entry[2] > time.monotonic():
+            return entry[0], entry[1]
+        return None
+
+    def _remember_driver(self, user_id, row):
+        if row is None:
+            self._drivers.pop(user_id, None)
+            return None
+        self._drivers[user_id] = (row[0], row[1], time.monotonic() + TTL_CONDUCTOR)
+        return row[0], row[1]
+
+    def driver_for_user(self, user_id):
+        # Devuelve (driver_id, is_approved) o None si el usuario no es conductor.
+        cached = self._cached_driver(user_id)
+        if cached is not None:
+            return cached
+
+        from .models import Driver
+
+        row = Driver.objects.filter(user_id=user_id).values_list('id', 'is_approved').first()
+        return self._remember_driver(user_id, row)
+
+    async def adriver_for_user(self, user_id):
+        cached = self._cached_driver(user_id)
+        if cached is not None:
+            return cached
+
+        from .models import Driver
+
+        row = await Driver.objects.filter(user_id=user_id).values_list('id', 'is_approved').afirst()
+        return self._remember_driver(user_id, row)
+
+    def forget_user(self, user_id):
+        self._drivers.pop(user_id, None)
+
+    def ingest(self, driver_id, lat, lng, timestamp=None, is_approved=True):
+        # Los timestamps del cliente pueden venir adelantados (hasta
+        # MAX_FUTURE_SECONDS): se acotan a la hora del servidor para que un lote
+        # adelantado no haga descartar los pings siguientes como antiguos.
+        ahora = time.time()
+        timestamp = ahora if timestamp is None else min(timestamp, ahora)
+        with self._lock:
+            anterior = self._latest.get(driver_id)
+            if anterior is not None and anterior[2] > timestamp:
+                return False
+            self._latest[driver_id] = (lat, lng, timestamp)
+            self._dirty.add(driver_id)
+            pendientes = len(self._dirty)
+
+        geo.sync_driver(driver_id, is_approved, lat, lng, seen=timestamp)
+        realtime.publish_driver_position(driver_id, lat, lng, timestamp)
+        self._ensure_worker()
+        if pendientes >= self.max_pending:
+            self._wakeup.set()
+        return True
+
+    def position(self, driver_id):
+        # Devuelve (lat, lng, timestamp) desde el buffer, o None si no hay ping reciente.
+        return self._latest.get(driver_id)
+
+    def pending_positions(self):
+        # Posiciones aún sin volcar a la base de datos: {driver_id: (lat, lng, timestamp)}.
+        with self._lock:
+            return {driver_id: self._latest[driver_id] for driver_id in self._dirty}
+
+    def flush(self):
+        from .models import Driver
+
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return 0
+                dirty, self._dirty = self._dirty, set()
+                snapshot = {driver_id: self._latest[driver_id] for driver_id in dirty}
+
+            drivers = [
+                Driver(id=driver_id, current_lat=lat, current_lng=lng, location_updated_at=geo.epoch_to_datetime(ts))
+                for driver_id, (lat, lng, ts) in snapshot.items()
+            ]
+            try:
+                Driver.objects.bulk_update(
+                    drivers, ['current_lat', 'current_lng', 'location_updated_at'], batch_size=self.batch_size,
+                )
+            except Exception:
+                logger.exception("No se pudieron guardar %s ubicaciones de conductores", len(drivers))
+                with self._lock:
+                    # Se reintenta en el siguiente volcado con la posición más reciente.
+                    self._dirty.update(dirty)
+                raise
+            return len(drivers)
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='location-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                pass  # ya registrado en flush(); se reintenta en la próxima vuelta
+
+
+location_buffer = LocationBuffer(
+    flush_interval=getattr(settings, 'LOCATION_FLUSH_INTERVAL', 2.0),
+    max_pending=getattr(settings, 'LOCATION_FLUSH_MAX_PENDING', 1000),
+)
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        location_buffer.flush()
+    except Exception:
+        pass
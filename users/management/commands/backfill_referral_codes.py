@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.referrals import TAMANO_LOTE, backfill_referral_codes
+
+
+class Command(BaseCommand):
+    help = "Asigna código de referido, por lotes, a los usuarios que aún no tienen"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=TAMANO_LOTE)
+
+    def handle(self, *args, **options):
+        total = backfill_referral_codes(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} códigos de referido asignados"))
@@ -0,0 +1,94 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+# ✅ BENCHMARK DE HASHERS DE CONTRASEÑA
+#
+# Mide cuántas verificaciones por segundo hace un núcleo con cada hasher
+# configurado (un login correcto = una verificación) y estima el pico de
+# logins por segundo para N núcleos. Ejemplo para comparar iteraciones:
+#
+#   python manage.py bench_hashers --pbkdf2-iterations 600000 300000 100000
+
+HEREDADOS = ('pbkdf2_sha1', 'bcrypt_sha256')  # sólo verifican hashes antiguos
+PASSWORD = 'contraseña-de-prueba'
+
+
+def _iteraciones(iteraciones):
+    return override_settings(PASSWORD_PBKDF2_ITERATIONS=iteraciones) if iteraciones else nullcontext()
+
+
+def _medir(indice, segundos, iteraciones=None):
+    hasher = get_hashers()[indice]
+    with _iteraciones(iteraciones):
+        encoded = hasher.encode(PASSWORD, hasher.salt())
+        n = 0
+        inicio = time.perf_counter()
+        while True:
+            hasher.verify(PASSWORD, encoded)
+            n += 1
+            transcurrido = time.perf_counter() - inicio
+            if transcurrido >= segundos:
+                return n / transcurrido
+
+
+def _medir_en_proceso(args):
+    # Proceso hijo: un núcleo por proceso.
+    import django
+
+    django.setup()
+    return _medir(*args)
+
+
+def _coste(hasher):
+    for atributo in ('iterations', 'work_factor', 'time_cost'):
+        if hasattr(hasher, atributo):
+            return str(getattr(hasher, atributo))
+    return '-'
+
+
+class Command(BaseCommand):
+    help = "Mide hashes de contraseña por segundo y por núcleo para dimensionar workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=2.0, help="Duración de cada medición")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Núcleos para la estimación")
+        parser.add_argument('--pbkdf2-iterations', type=int, nargs='*', default=[],
+                            help="Iteraciones PBKDF2 adicionales a comparar")
+        parser.add_argument('--parallel', action='store_true',
+                            help="Mide en paralelo con --workers procesos en lugar de extrapolar")
+
+    def handle(self, *args, **options):
+        casos = []
+        for indice, hasher in enumerate(get_hashers()):
+            if hasher.algorithm in HEREDADOS:
+                continue
+            try:
+                hasher.encode(PASSWORD, hasher.salt())
+            except ValueError:
+                continue  # librería opcional no instalada (argon2-cffi)
+            casos.append((indice, None))
+            if hasher.algorithm == 'pbkdf2_sha256':
+                casos += [(indice, n) for n in options['pbkdf2_iterations']]
+
+        workers = options['workers']
+        segundos = options['seconds']
+        self.stdout.write(f"{'hasher':<32}{'coste':>10}{'hash/s/núcleo':>16}{f'logins/s ({workers} núcleos)':>28}")
+        for indice, iteraciones in casos:
+            hasher = get_hashers()[indice]
+            with _iteraciones(iteraciones):
+                coste = _coste(hasher)
+            por_nucleo = _medir(indice, segundos, iteraciones)
+            if options['parallel'] and workers > 1:
+                with ProcessPoolExecutor(workers) as pool:
+                    total = sum(pool.map(_medir_en_proceso, [(indice, segundos, iteraciones)] * workers))
+            else:
+                total = por_nucleo * workers
+            nombre = type(hasher).__name__ + (' *' if indice == 0 else '')
+            self.stdout.write(f"{nombre:<32}{coste:>10}{por_nucleo:>16.1f}{total:>28.1f}")
+        self.stdout.write("* hasher preferido (PASSWORD_HASHER)")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from users.models import Promotion
+from users.promotions import TAMANO_LOTE, active_promotions, evaluate_promotions
+
+
+class Command(BaseCommand):
+    help = "Asigna en lote las promociones activas a los usuarios que cumplen sus requisitos"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--promotion', type=int, nargs='*', help="IDs de promoción (por defecto, las activas)")
+        parser.add_argument('--batch-size', type=int, default=TAMANO_LOTE)
+        parser.add_argument('--dry-run', action='store_true', help="Sólo cuenta los usuarios elegibles")
+
+    def handle(self, *args, **options):
+        if options['promotion']:
+            promotions = Promotion.objects.filter(pk__in=options['promotion'])
+        else:
+            promotions = active_promotions()
+        resultado = evaluate_promotions(promotions, batch_size=options['batch_size'], dry_run=options['dry_run'])
+        for promotion_id, total in resultado.items():
+            self.stdout.write(f"Promoción {promotion_id}: {total} usuarios")
+        verbo = "elegibles" if options['dry_run'] else "premiados"
+        self.stdout.write(self.style.SUCCESS(f"✅ {sum(resultado.values())} usuarios {verbo}"))
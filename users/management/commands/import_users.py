@@ -0,0 +1,31 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.registration import ROLES, TAMANO_LOTE, import_users
+
+
+class Command(BaseCommand):
+    help = "Alta masiva de usuarios desde un CSV (username,email[,password,license_number,car_plate])"
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path')
+        parser.add_argument('--role', choices=ROLES, default='conductor')
+        parser.add_argument('--batch-size', type=int, default=TAMANO_LOTE)
+
+    def handle(self, *args, **options):
+        try:
+            archivo = open(options['csv_path'], newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(str(exc))
+        with archivo:
+            lector = csv.DictReader(archivo)
+            faltan = {'username', 'email'} - set(lector.fieldnames or ())
+            if faltan:
+                raise CommandError(f"Faltan columnas en el CSV: {', '.join(sorted(faltan))}")
+            filas = (
+                {clave: (valor or '').strip() for clave, valor in fila.items() if clave}
+                for fila in lector
+            )
+            creados, omitidos = import_users(filas, options['role'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✅ {creados} usuarios creados, {omitidos} omitidos (sin username o ya existían)"))
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# ✅ BENCHMARK DE CARGA HTTP (WSGI vs ASGI)
+#
+# Cliente HTTP/1.1 mínimo con conexiones keep-alive sobre asyncio, para no
+# depender de herramientas externas. Para comparar modos se levanta el servidor
+# con SERVER_MODE=wsgi y luego con SERVER_MODE=asgi y se ejecuta el mismo comando:
+#
+#   python manage.py loadbench http://localhost:8000/api/driver/update-location/ \
+#       --method POST --body '{"lat": 4.6, "lng": -74.1}' --token <access> \
+#       --concurrency 200 --duration 20
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    k = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[k]
+
+
+class Command(BaseCommand):
+    help = "Mide peticiones por segundo y latencias p50/p99 contra una URL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('url')
+        parser.add_argument('--method', default='GET')
+        parser.add_argument('--body', default=None, help="Cuerpo JSON de la petición")
+        parser.add_argument('--token', default=None, help="Access token JWT (cabecera Bearer)")
+        parser.add_argument('--host-header', default=None, help="Valor de la cabecera Host (ALLOWED_HOSTS)")
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--duration', type=float, default=10.0, help="Segundos de prueba")
+        parser.add_argument('--warmup', type=float, default=1.0, help="Segundos de calentamiento no medidos")
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http':
+            raise CommandError("Sólo se admiten URLs http://")
+        body = options['body'].encode() if options['body'] else b''
+        if body:
+            json.loads(body)
+
+        ruta = url.path + (f'?{url.query}' if url.query else '')
+        cabeceras = [
+            f"{options['method'].upper()} {ruta} HTTP/1.1",
+            f"Host: {options['host_header'] or url.netloc}",
+            "Connection: keep-alive",
+            f"Content-Length: {len(body)}",
+        ]
+        if body:
+            cabeceras.append("Content-Type: application/json")
+        if options['token']:
+            cabeceras.append(f"Authorization: Bearer {options['token']}")
+        peticion = ("\r\n".join(cabeceras) + "\r\n\r\n").encode() + body
+
+        resultado = asyncio.run(self._bench(
+            url.hostname, url.port or 80, peticion,
+            options['concurrency'], options['duration'], options['warmup'],
+        ))
+        latencias, estados, errores, segundos = resultado
+        latencias.sort()
+        total = len(latencias)
+        self.stdout.write(f"URL:          {options['url']}")
+        self.stdout.write(f"Concurrencia: {options['concurrency']}  Duración: {segundos:.1f}s")
+        self.stdout.write(f"Peticiones:   {total}  Errores de conexión: {errores}")
+        self.stdout.write(f"Estados:      {dict(sorted(estados.items()))}")
+        self.stdout.write(f"RPS:          {total / segundos:.1f}")
+        self.stdout.write(
+            f"Latencia ms:  p50={_percentil(latencias, 50) * 1000:.1f} "
+            f"p90={_percentil(latencias, 90) * 1000:.1f} "
+            f"p99={_percentil(latencias, 99) * 1000:.1f} "
+            f"max={(latencias[-1] if latencias else 0) * 1000:.1f}"
+        )
+
+    async def _bench(self, host, port, peticion, concurrency, duration, warmup):
+        latencias = []
+        estados = {}
+        errores = 0
+        inicio_medida = time.perf_counter() + warmup
+        fin = inicio_medida + duration
+
+        async def worker():
+            nonlocal errores
+            reader = writer = None
+            while time.perf_counter() < fin:
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(host, port)
+                    t0 = time.perf_counter()
+                    writer.write(peticion)
+                    await writer.drain()
+                    estado, cerrar = await self._leer_respuesta(reader)
+                    t1 = time.perf_counter()
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    errores += 1
+                    if writer is not None:
+                        writer.close()
+                    reader = writer = None
+                    await asyncio.sleep(0.05)
+                    continue
+                if t0 >= inicio_medida:
+                    latencias.append(t1 - t0)
+                    estados[estado] = estados.get(estado, 0) + 1
+                if cerrar:
+                    writer.close()
+                    reader = writer = None
+            if writer is not None:
+                writer.close()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencias, estados, errores, duration
+
+    @staticmethod
+    async def _leer_respuesta(reader):
+        linea = await reader.readuntil(b"\r\n")
+        estado = int(linea.split()[1])
+        largo = 0
+        chunked = False
+        cerrar = False
+        while True:
+            linea = await reader.readuntil(b"\r\n")
+            if linea == b"\r\n":
+                break
+            nombre, _, valor = linea.decode('latin1').partition(':')
+            nombre = nombre.strip().lower()
+            valor = valor.strip().lower()
+            if nombre == 'content-length':
+                largo = int(valor)
+            elif nombre == 'transfer-encoding' and 'chunked' in valor:
+                chunked = True
+            elif nombre == 'connection' and valor == 'close':
+                cerrar = True
+        if chunked:
+            while True:
+                tam = int((await reader.readuntil(b"\r\n")).strip(), 16)
+                await reader.readexactly(tam + 2)
+                if tam == 0:
+                    break
+        elif largo:
+            await reader.readexactly(largo)
+        return estado, cerrar
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.referrals import TAMANO_LOTE, rebuild_referral_links
+
+
+class Command(BaseCommand):
+    help = "Reconstruye la red de referidos (tabla de cierre) desde referred_by"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=TAMANO_LOTE)
+
+    def handle(self, *args, **options):
+        total = rebuild_referral_links(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} enlaces de referido creados"))
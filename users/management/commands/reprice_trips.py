@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from users.fares import reprice_trips
+from users.models import Trip
+
+
+class Command(BaseCommand):
+    help = "Recalcula en lote la tarifa de los viajes con la tarifa configurada (o la indicada)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', nargs='*', default=['pending'], help="Estados de viaje a recalcular")
+        parser.add_argument('--base', type=float, default=None, help="Tarifa base (por defecto FARE_BASE)")
+        parser.add_argument('--per-km', type=float, default=None, help="Precio por km (por defecto FARE_PER_KM)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = reprice_trips(
+            Trip.objects.filter(status__in=options['status']),
+            base=options['base'],
+            per_km=options['per_km'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} viajes recalculados"))
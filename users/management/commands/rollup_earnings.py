@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from users.earnings import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero los acumulados diarios y semanales de ganancias"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='*', help="IDs de usuario a recalcular (por defecto, todos)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = rebuild_rollups(user_ids=options['user'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} acumulados recalculados"))
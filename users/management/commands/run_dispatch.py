@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.dispatch import run_dispatch_tick, MAX_VIAJES_POR_TICK, RADIO_MAXIMO_KM
+
+
+# Las asignaciones se publican con publish_trip_status, pero con el broker por
+# defecto (InProcessBroker) este proceso no comparte suscriptores con el
+# servidor ASGI: los clientes ven el cambio al consultar el viaje, no por stream.
+class Command(BaseCommand):
+    help = "Asigna en lote los viajes pendientes a los conductores libres más cercanos"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0, help="Segundos entre ticks")
+        parser.add_argument('--limit', type=int, default=MAX_VIAJES_POR_TICK, help="Máximo de viajes por tick")
+        parser.add_argument('--radius-km', type=float, default=RADIO_MAXIMO_KM)
+        parser.add_argument('--once', action='store_true', help="Ejecuta un solo tick y termina")
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.monotonic()
+            asignaciones = run_dispatch_tick(limit=options['limit'], radius_km=options['radius_km'])
+            if asignaciones:
+                self.stdout.write(f"🚕 {len(asignaciones)} viajes asignados en {time.monotonic() - inicio:.3f}s")
+            if options['once']:
+                break
+            time.sleep(max(0.0, options['interval'] - (time.monotonic() - inicio)))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0016_alter_chatmessage_options_alter_customuser_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripTrail',
+            fields=[
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trail', serialize=False, to='users.trip')),
+                ('data', models.BinaryField(default=b'')),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('distance_km', models.FloatField(default=0)),
+                ('last_ts', models.BigIntegerField(blank=True, null=True)),
+                ('last_lat_e6', models.IntegerField(blank=True, null=True)),
+                ('last_lng_e6', models.IntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Recorrido',
+                'verbose_name_plural': ' 12. Recorridos de viajes',
+            },
+        ),
+    ]
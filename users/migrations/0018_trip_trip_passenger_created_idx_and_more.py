@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_triptrail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['passenger', '-created_at'], name='trip_passenger_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['driver', '-created_at'], name='trip_driver_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['status', '-created_at'], name='trip_status_created_idx'),
+        ),
+    ]
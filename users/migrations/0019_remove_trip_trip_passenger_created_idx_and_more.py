@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_trip_trip_passenger_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='trip',
+            name='trip_passenger_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='trip',
+            name='trip_driver_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='trip',
+            name='trip_status_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['trip', 'timestamp', 'id'], name='chat_trip_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['passenger', '-created_at', '-id'], name='trip_passenger_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['driver', '-created_at', '-id'], name='trip_driver_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='trip_status_created_idx'),
+        ),
+    ]
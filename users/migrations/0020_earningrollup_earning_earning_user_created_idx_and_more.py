@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_remove_trip_trip_passenger_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EarningRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Día'), ('week', 'Semana')], max_length=10)),
+                ('period_start', models.DateField()),
+                ('earning_type', models.CharField(choices=[('referido', 'Referido'), ('promocion', 'Promoción'), ('viaje', 'Viaje'), ('otro', 'Otro')], max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Acumulado de ganancias',
+                'verbose_name_plural': ' 13. Acumulados de ganancias',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='earning',
+            index=models.Index(fields=['user', 'created_at'], name='earning_user_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='earningrollup',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='earning_rollups', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='earningrollup',
+            index=models.Index(fields=['user', 'period', '-period_start'], name='earning_rollup_history_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='earningrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'period', 'period_start', 'earning_type'), name='earning_rollup_unique_period'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:02
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def quitar_duplicados(apps, schema_editor):
+    # Conserva la asignación más antigua de cada (usuario, promoción).
+    UserPromotion = apps.get_model('users', 'UserPromotion')
+    anterior = UserPromotion.objects.filter(
+        user_id=OuterRef('user_id'), promotion_id=OuterRef('promotion_id'), id__lt=OuterRef('id'),
+    )
+    UserPromotion.objects.filter(Exists(anterior)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0020_earningrollup_earning_earning_user_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(quitar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userpromotion',
+            constraint=models.UniqueConstraint(fields=('user', 'promotion'), name='user_promotion_unique'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:03
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def comprobar_pagos_duplicados(apps, schema_editor):
+    # Son pagos: no se borran automáticamente. Se revisan (y se anulan a mano,
+    # seguido de `manage.py rollup_earnings`) antes de volver a migrar.
+    Earning = apps.get_model('users', 'Earning')
+    duplicados = list(
+        Earning.objects.filter(related_promotion__isnull=False)
+        .values('user_id', 'related_promotion_id', 'earning_type')
+        .annotate(n=Count('id')).filter(n__gt=1)
+        .order_by('user_id', 'related_promotion_id', 'earning_type')[:20]
+    )
+    if duplicados:
+        raise RuntimeError(
+            "Hay pagos de promoción duplicados (usuario, promoción, tipo: cantidad); corrígelos antes de migrar: "
+            + ", ".join(
+                f"({d['user_id']}, {d['related_promotion_id']}, {d['earning_type']}: {d['n']})" for d in duplicados
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0021_userpromotion_user_promotion_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(comprobar_pagos_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='earning',
+            constraint=models.UniqueConstraint(condition=models.Q(('related_promotion__isnull', False)), fields=('user', 'related_promotion', 'earning_type'), name='earning_unique_promotion_payout'),
+        ),
+    ]
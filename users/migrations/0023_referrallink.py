@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def poblar_red_de_referidos(apps, schema_editor):
+    # Recorre referred_by en memoria y crea un enlace por cada ancestro.
+    CustomUser = apps.get_model('users', 'CustomUser')
+    ReferralLink = apps.get_model('users', 'ReferralLink')
+    padres = dict(CustomUser.objects.filter(referred_by__isnull=False).values_list('pk', 'referred_by_id'))
+    lote = []
+    for usuario in padres:
+        vistos = {usuario}
+        ancestro, depth = padres[usuario], 1
+        while ancestro is not None and ancestro not in vistos:
+            lote.append(ReferralLink(ancestor_id=ancestro, descendant_id=usuario, depth=depth))
+            vistos.add(ancestro)
+            ancestro, depth = padres.get(ancestro), depth + 1
+        if len(lote) >= 5000:
+            ReferralLink.objects.bulk_create(lote)
+            lote = []
+    ReferralLink.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0022_earning_earning_unique_promotion_payout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referral_descendant_links', to=settings.AUTH_USER_MODEL)),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referral_ancestor_links', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Enlace de referido',
+                'verbose_name_plural': ' 14. Red de referidos',
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='referral_ancestor_depth_idx'), models.Index(fields=['descendant', 'depth'], name='referral_descendant_depth_idx'), models.Index(fields=['depth', 'ancestor'], name='referral_depth_ancestor_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='referral_link_unique_pair')],
+            },
+        ),
+        migrations.RunPython(poblar_red_de_referidos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:07
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def comprobar_emails_duplicados(apps, schema_editor):
+    # No se modifican cuentas automáticamente: los duplicados se resuelven a mano.
+    CustomUser = apps.get_model('users', 'CustomUser')
+    duplicados = list(
+        CustomUser.objects.exclude(email='').values('email')
+        .annotate(n=Count('id')).filter(n__gt=1).values_list('email', flat=True)[:20]
+    )
+    if duplicados:
+        raise RuntimeError(
+            "Hay usuarios con el mismo email; corrígelos antes de migrar: " + ", ".join(duplicados)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0023_referrallink'),
+    ]
+
+    operations = [
+        migrations.RunPython(comprobar_emails_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(condition=models.Q(('email', ''), _negated=True), fields=('email',), name='customuser_unique_email'),
+        ),
+    ]
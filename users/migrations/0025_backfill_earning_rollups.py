@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncWeek
+from django.utils import timezone
+
+
+def _inicio(dt, period):
+    fecha = timezone.localdate(dt) if timezone.is_aware(dt) else dt.date()
+    if period == 'week':
+        return fecha - timedelta(days=fecha.weekday())
+    return fecha
+
+
+def poblar_acumulados(apps, schema_editor):
+    # Recalcula EarningRollup desde las ganancias ya existentes (mismo GROUP BY
+    # que earnings.rebuild_rollups, con los modelos históricos).
+    Earning = apps.get_model('users', 'Earning')
+    EarningRollup = apps.get_model('users', 'EarningRollup')
+    EarningRollup.objects.all().delete()
+    for period, truncar in (('day', TruncDay), ('week', TruncWeek)):
+        filas = (
+            Earning.objects.annotate(inicio=truncar('created_at'))
+            .values('user_id', 'earning_type', 'inicio')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+        )
+        lote = []
+        for fila in filas.iterator(chunk_size=1000):
+            lote.append(EarningRollup(
+                user_id=fila['user_id'],
+                period=period,
+                period_start=_inicio(fila['inicio'], period),
+                earning_type=fila['earning_type'],
+                total=fila['total'],
+                count=fila['count'],
+            ))
+            if len(lote) >= 1000:
+                EarningRollup.objects.bulk_create(lote)
+                lote = []
+        EarningRollup.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0024_customuser_customuser_unique_email'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_acumulados, migrations.RunPython.noop),
+    ]
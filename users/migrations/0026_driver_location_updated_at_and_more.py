@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0025_backfill_earning_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driver',
+            name='location_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['location_updated_at'], name='driver_location_seen_idx'),
+        ),
+    ]
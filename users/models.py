@@ -1,9 +1,19 @@
-import math
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.db.models import Sum
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+
+from . import geo
+from .fares import compute_fare
+from .location import location_buffer
+from . import realtime
+from . import earnings
+from . import promotions
+from . import referrals
+from . import authentication
+from . import reference
 
 class CustomUser(AbstractUser):
     referral_code = models.CharField(max_length=20, unique=True, null=True, blank=True)
@@ -12,9 +22,47 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._referidor_guardado = instance.__dict__.get('referred_by_id')
+        return instance
+
+    def clean(self):
+        super().clean()
+        if self.referred_by_id and self.pk and (
+            self.referred_by_id == self.pk or referrals.is_descendant(self.referred_by_id, self.pk)
+        ):
+            raise ValidationError({'referred_by': "No puede ser referido por sí mismo ni por alguien de su red."})
+
     class Meta:
         verbose_name = "Usuario"  # Usa un carácter invisible
         verbose_name_plural = " 01. Usuarios"
+        constraints = [
+            # AbstractUser no exige email único; los vacíos se permiten repetidos.
+            models.UniqueConstraint(fields=['email'], condition=~models.Q(email=''), name='customuser_unique_email'),
+        ]
+
+# ✅ GRAFO DE REFERIDOS: una fila por par (ancestro, descendiente), ver users/referrals.py
+class ReferralLink(models.Model):
+    ancestor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='referral_descendant_links')
+    descendant = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='referral_ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.ancestor_id} → {self.descendant_id} (nivel {self.depth})"
+
+    class Meta:
+        verbose_name = "Enlace de referido"
+        verbose_name_plural = " 14. Red de referidos"
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='referral_link_unique_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['ancestor', 'depth'], name='referral_ancestor_depth_idx'),
+            models.Index(fields=['descendant', 'depth'], name='referral_descendant_depth_idx'),
+            models.Index(fields=['depth', 'ancestor'], name='referral_depth_ancestor_idx'),
+        ]
 
 class Driver(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
@@ -23,6 +71,7 @@ class Driver(models.Model):
     is_approved = models.BooleanField(default=False)
     current_lat = models.FloatField(null=True, blank=True)
     current_lng = models.FloatField(null=True, blank=True)
+    location_updated_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Conductor: {self.user.username}"
@@ -30,6 +79,9 @@ class Driver(models.Model):
     class Meta:
         verbose_name = "Usuario"  # Usa un carácter invisible
         verbose_name_plural = " 02. Driver"
+        indexes = [
+            models.Index(fields=['location_updated_at'], name='driver_location_seen_idx'),
+        ]
 
 class Passenger(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
@@ -64,33 +116,60 @@ class Trip(models.Model):
     def __str__(self):
         return f"Viaje {self.id} - Pasajero: {self.passenger.user.username} - Estado: {self.status}"
 
+    COORD_FIELDS = ('origin_lat', 'origin_lng', 'destination_lat', 'destination_lng')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._coords_guardadas = instance._coords()
+        return instance
+
+    def _coords(self):
+        return tuple(self.__dict__.get(f) for f in self.COORD_FIELDS)
+
     def save(self, *args, **kwargs):
-        TARIFA_BASE = 3000
-        PRECIO_POR_KM = 1200
-
-        def haversine(lat1, lon1, lat2, lon2):
-            R = 6371
-            lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-            dlat = lat2 - lat1
-            dlon = lon2 - lon1
-            a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-            c = 2 * math.asin(math.sqrt(a))
-            return R * c
-
-        if self.origin_lat and self.origin_lng and self.destination_lat and self.destination_lng:
-            distancia_km = haversine(self.origin_lat, self.origin_lng, self.destination_lat, self.destination_lng)
-            self.fare = round(TARIFA_BASE + (distancia_km * PRECIO_POR_KM), 2)
-        else:
-            self.fare = None
+        # La tarifa sólo se recalcula si cambian las coordenadas (o es un viaje nuevo).
+        update_fields = kwargs.get('update_fields')
+        coords = self._coords()
+        if update_fields is None or set(update_fields) & set(self.COORD_FIELDS):
+            if coords != getattr(self, '_coords_guardadas', None):
+                self.fare = compute_fare(*coords)
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'fare'}
 
         super().save(*args, **kwargs)
+        self._coords_guardadas = coords
 
     class Meta:
         verbose_name = "Usuario"  # Usa un carácter invisible
         verbose_name_plural = " 04. Trips"
+        indexes = [
+            models.Index(fields=['passenger', '-created_at', '-id'], name='trip_passenger_created_idx'),
+            models.Index(fields=['driver', '-created_at', '-id'], name='trip_driver_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='trip_status_created_idx'),
+        ]
 
         
 
+# ✅ RECORRIDO GPS DEL VIAJE (blob compacto, ver users/trails.py)
+class TripTrail(models.Model):
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, primary_key=True, related_name='trail')
+    data = models.BinaryField(default=b'')
+    point_count = models.PositiveIntegerField(default=0)
+    distance_km = models.FloatField(default=0)
+    last_ts = models.BigIntegerField(null=True, blank=True)
+    last_lat_e6 = models.IntegerField(null=True, blank=True)
+    last_lng_e6 = models.IntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Recorrido del viaje {self.trip_id} ({self.point_count} puntos)"
+
+    class Meta:
+        verbose_name = "Recorrido"
+        verbose_name_plural = " 12. Recorridos de viajes"
+
+
 class Report(models.Model):
     REPORT_TYPE_CHOICES = [
         ('incidente', 'Incidente'),
@@ -164,6 +243,9 @@ class UserPromotion(models.Model):
     class Meta:
         verbose_name = "Usuario"  # Usa un carácter invisible
         verbose_name_plural = " 06. Promociones personalizadas"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'promotion'], name='user_promotion_unique'),
+        ]
         
 
 class Policy(models.Model):
@@ -199,25 +281,139 @@ class Earning(models.Model):
 
     class Meta:
         verbose_name = "Detalle de Ganancia"
-        verbose_name_plural = " 08. Detalle de Ganancias"    
+        verbose_name_plural = " 08. Detalle de Ganancias"
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='earning_user_created_idx'),
+        ]
+        constraints = [
+            # Un único pago por (usuario, promoción, tipo).
+            models.UniqueConstraint(
+                fields=['user', 'related_promotion', 'earning_type'],
+                condition=models.Q(related_promotion__isnull=False),
+                name='earning_unique_promotion_payout',
+            ),
+        ]
+
+# ✅ ACUMULADO DE GANANCIAS POR PERIODO (ver users/earnings.py)
+class EarningRollup(models.Model):
+    PERIOD_CHOICES = [
+        ('day', 'Día'),
+        ('week', 'Semana'),
+    ]
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='earning_rollups')
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    earning_type = models.CharField(max_length=20, choices=Earning.EARNING_TYPE_CHOICES)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.period} {self.period_start} - {self.earning_type}: ${self.total}"
+
+    class Meta:
+        verbose_name = "Acumulado de ganancias"
+        verbose_name_plural = " 13. Acumulados de ganancias"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'period', 'period_start', 'earning_type'],
+                name='earning_rollup_unique_period',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'period', '-period_start'], name='earning_rollup_history_idx'),
+        ]
+
+@receiver(pre_save, sender=Earning)
+def guardar_ganancia_anterior(sender, instance, **kwargs):
+    # Fila tal como está en la base de datos, para corregir los acumulados al editar.
+    instance._ganancia_anterior = None
+    if instance.pk and not instance._state.adding:
+        instance._ganancia_anterior = (
+            sender.objects.filter(pk=instance.pk).only('user_id', 'amount', 'earning_type', 'created_at').first()
+        )
+
+@receiver(post_save, sender=Earning)
+def acumular_ganancia(sender, instance, created, **kwargs):
+    # Los .update() sobre querysets no pasan por aquí: se corrigen con `manage.py rollup_earnings`.
+    anterior = None if created else getattr(instance, '_ganancia_anterior', None)
+    if anterior is not None:
+        campos = ('user_id', 'amount', 'earning_type', 'created_at')
+        if all(getattr(anterior, c) == getattr(instance, c) for c in campos):
+            return
+        earnings.apply_rollups([anterior], sign=-1)
+    earnings.apply_rollups([instance])
+
+@receiver(post_delete, sender=Earning)
+def descontar_ganancia(sender, instance, **kwargs):
+    earnings.apply_rollups([instance], sign=-1)
 
 @receiver(post_save, sender=UserPromotion)
 def crear_ganancia_por_promocion(sender, instance, created, **kwargs):
+    # Asignaciones individuales (admin). Las masivas usan promotions.award_promotion_bulk.
+    if created:
+        promotions.pay_promotion(instance.user_id, instance.promotion)
+
+# ✅ MANTIENE LA RED DE REFERIDOS AL DÍA
+@receiver(post_save, sender=CustomUser)
+def enlazar_referido(sender, instance, created, **kwargs):
+    anterior = None if created else getattr(instance, '_referidor_guardado', instance.referred_by_id)
     if created:
-        existe = Earning.objects.filter(
-            user=instance.user,
-            related_promotion=instance.promotion,
-            earning_type='promocion'
-        ).exists()
-
-        if not existe:
-            Earning.objects.create(
-                user=instance.user,
-                amount=instance.promotion.bonus_amount,
-                earning_type='promocion',
-                related_promotion=instance.promotion,
-                description=f"Ganancia automática por promoción: {instance.promotion.name}"
-            )
+        referrals.assign_referral_code(instance)
+    if created and instance.referred_by_id:
+        referrals.link_new_user(instance.pk, instance.referred_by_id)
+    elif instance.referred_by_id != anterior:
+        referrals.move_subtree(instance.pk, instance.referred_by_id)
+    instance._referidor_guardado = instance.referred_by_id
+
+@receiver(pre_delete, sender=CustomUser)
+def desenlazar_referidos(sender, instance, **kwargs):
+    referrals.detach_descendants(instance.pk)
+
+# ✅ INVALIDA LOS CLAIMS EN CACHÉ DEL USUARIO (rol, staff, borrado)
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def olvidar_claims_usuario(sender, instance, **kwargs):
+    authentication.forget_user(instance.pk)
+
+@receiver(post_save, sender=Passenger)
+@receiver(post_delete, sender=Passenger)
+def olvidar_claims_pasajero(sender, instance, **kwargs):
+    authentication.forget_user(instance.user_id)
+
+# ✅ REVOCA LOS TOKENS CON CLAIMS AL DESACTIVAR/BORRAR EL USUARIO O QUITARLE EL ROL
+@receiver(post_save, sender=CustomUser)
+def revocar_tokens_usuario_inactivo(sender, instance, **kwargs):
+    if not instance.is_active:
+        authentication.revoke_user(instance.pk)
+
+@receiver(post_delete, sender=CustomUser)
+def revocar_tokens_usuario_borrado(sender, instance, **kwargs):
+    authentication.revoke_user(instance.pk)
+
+@receiver(post_delete, sender=Driver)
+@receiver(post_delete, sender=Passenger)
+def revocar_tokens_sin_rol(sender, instance, **kwargs):
+    authentication.revoke_user(instance.user_id)
+
+# ✅ MANTIENE EL ÍNDICE ESPACIAL DE CONDUCTORES AL DÍA
+@receiver(post_save, sender=Driver)
+def sincronizar_indice_conductor(sender, instance, **kwargs):
+    location_buffer.forget_user(instance.user_id)
+    authentication.forget_user(instance.user_id)
+    # La posición del buffer es más reciente que la guardada en la fila.
+    pos = location_buffer.position(instance.id)
+    if pos:
+        lat, lng, visto = pos
+    else:
+        lat, lng = instance.current_lat, instance.current_lng
+        visto = instance.location_updated_at.timestamp() if instance.location_updated_at else None
+    geo.sync_driver(instance.id, instance.is_approved, lat, lng, seen=visto)
+
+@receiver(post_delete, sender=Driver)
+def quitar_conductor_del_indice(sender, instance, **kwargs):
+    location_buffer.forget_user(instance.user_id)
+    authentication.forget_user(instance.user_id)
+    geo.sync_driver(instance.id, False, None, None)
 
 # ✅ MODELO PROXY FINAL PARA RESUMEN DE GANANCIAS
 class ResumenGananciasProxy(CustomUser):
@@ -238,4 +434,27 @@ class ChatMessage(models.Model):
 
     class Meta:
         verbose_name = "Mensaje de chat"  # Usa un carácter invisible
-        verbose_name_plural = " 10. Mensajes de Chat"        
+        verbose_name_plural = " 10. Mensajes de Chat"
+        indexes = [
+            models.Index(fields=['trip', 'timestamp', 'id'], name='chat_trip_timestamp_idx'),
+        ]        
+
+
+# ✅ PUBLICA CADA MENSAJE NUEVO A LOS SUSCRIPTORES DEL CHAT DEL VIAJE
+@receiver(post_save, sender=ChatMessage)
+def publicar_mensaje_chat(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: realtime.publish_chat_message(instance))
+
+
+# ✅ INVALIDA LA CACHÉ DE POLÍTICAS Y PROMOCIONES TRAS GUARDAR/BORRAR (admin)
+@receiver(post_save, sender=Policy)
+@receiver(post_delete, sender=Policy)
+def invalidar_politica_cacheada(sender, instance, **kwargs):
+    transaction.on_commit(reference.forget_policy)
+
+
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def invalidar_promociones_cacheadas(sender, instance, **kwargs):
+    transaction.on_commit(reference.forget_promotions)
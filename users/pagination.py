@@ -0,0 +1,116 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# ✅ PAGINACIÓN POR CURSOR (KEYSET) SOBRE (fecha, id)
+#
+# ?cursor=<c>  página siguiente a partir de la última fila vista.
+# ?since=<c>   sólo filas más nuevas que <c>, de la más antigua a la más nueva,
+#              para que el cliente descargue únicamente lo que le falta.
+# Cada respuesta incluye "since": el cursor de la fila más nueva entregada.
+class KeysetPagination(BasePagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    since_query_param = 'since'
+    ordering_field = 'created_at'
+    descending = True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    def page_queryset(self, queryset, request):
+        # Devuelve el queryset ya filtrado, ordenado y recortado (page_size + 1),
+        # para poder evaluarlo también con el ORM async (ver set_page()).
+        # Acepta tanto un Request de DRF como un HttpRequest de una vista async.
+        params = getattr(request, 'query_params', request.GET)
+        self.request = request
+        self.page_size_actual = self.get_page_size(request)
+        cursor = self.decode_cursor(params.get(self.cursor_query_param))
+        since = self.decode_cursor(params.get(self.since_query_param))
+        self.since_fallback = params.get(self.since_query_param)
+        field = self.ordering_field
+
+        if since is not None:
+            self.mode, self.page_descending, self.position = self.since_query_param, False, since
+        else:
+            self.mode, self.page_descending, self.position = self.cursor_query_param, self.descending, cursor
+
+        if self.position is not None:
+            valor, pk = self.position
+            op = 'lt' if self.page_descending else 'gt'
+            queryset = queryset.filter(Q(**{f'{field}__{op}': valor}) | Q(**{field: valor, f'pk__{op}': pk}))
+        orden = (f'-{field}', '-pk') if self.page_descending else (field, 'pk')
+        return queryset.order_by(*orden)[:self.page_size_actual + 1]
+
+    def set_page(self, filas):
+        self.has_more = len(filas) > self.page_size_actual
+        filas = filas[:self.page_size_actual]
+        self.last = filas[-1] if filas else None
+        if not filas or (self.page_descending and self.position is not None):
+            # En páginas antiguas la fila más nueva no es la más nueva de todas.
+            self.newest = None
+        else:
+            self.newest = filas[0] if self.page_descending else filas[-1]
+        return filas
+
+    def get_page_size(self, request):
+        try:
+            params = getattr(request, 'query_params', request.GET)
+            size = int(params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, obj):
+        raw = f"{getattr(obj, self.ordering_field).isoformat()}|{obj.pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            valor, pk = base64.urlsafe_b64decode(encoded.encode()).decode().rsplit('|', 1)
+            return datetime.fromisoformat(valor), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound('Cursor inválido.')
+
+    def get_next_link(self):
+        if not self.has_more:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.since_query_param)
+        url = remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.mode, self.encode_cursor(self.last))
+
+    def get_paginated_data(self, data):
+        if self.newest is not None:
+            since = self.encode_cursor(self.newest)
+        else:
+            since = self.since_fallback
+        return {
+            'next': self.get_next_link(),
+            'since': since,
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+
+class TripPagination(KeysetPagination):
+    ordering_field = 'created_at'
+    descending = True
+
+
+class ChatMessagePagination(KeysetPagination):
+    page_size = 50
+    max_page_size = 200
+    ordering_field = 'timestamp'
+    descending = False
@@ -0,0 +1,167 @@
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import earnings
+
+# ✅ EVALUACIÓN MASIVA DE PROMOCIONES
+#
+# Para cada promoción activa se buscan los usuarios que cumplen min_trips y
+# min_invited_users con una sola consulta por lote (un COUNT correlacionado
+# por relación, sin una consulta por usuario), y se insertan UserPromotion y
+# Earning con bulk_create. Los viajes (completados) y los referidos (date_joined) se
+# cuentan dentro de la vigencia de la promoción. Las promociones sin
+# requisitos no se evalúan: se siguen asignando a mano desde el admin.
+
+TAMANO_LOTE = 5000
+
+
+def active_promotions(now=None):
+    from .models import Promotion
+
+    now = now or timezone.now()
+    return Promotion.objects.filter(start_date__lte=now, end_date__gte=now)
+
+
+def _conteo(queryset, campo_usuario):
+    # Subconsulta correlacionada con un solo COUNT por usuario: cada relación se
+    # cuenta por separado, sin el producto viajes × referidos de un JOIN común.
+    filas = (
+        queryset.filter(**{campo_usuario: OuterRef('pk')})
+        .order_by().values(campo_usuario).annotate(c=Count('pk')).values('c')
+    )
+    return Coalesce(Subquery(filas, output_field=IntegerField()), Value(0))
+
+
+def eligible_users(promotion):
+    """Usuarios del grupo objetivo que cumplen los requisitos y aún no tienen la promoción."""
+    from .models import Trip, UserPromotion
+
+    User = get_user_model()
+    usuarios = User.objects.filter(is_active=True).exclude(
+        Exists(UserPromotion.objects.filter(user=OuterRef('pk'), promotion=promotion))
+    )
+    if promotion.target_group == 'conductor':
+        usuarios = usuarios.filter(driver__isnull=False)
+    elif promotion.target_group == 'usuario':
+        usuarios = usuarios.filter(passenger__isnull=False)
+
+    vigencia = (promotion.start_date, promotion.end_date)
+    conteos = {}
+    if promotion.min_trips:
+        completados = Trip.objects.filter(status='completed', created_at__range=vigencia)
+        como_conductor = _conteo(completados, 'driver__user_id')
+        como_pasajero = _conteo(completados, 'passenger__user_id')
+        if promotion.target_group == 'conductor':
+            conteos['viajes'] = como_conductor
+        elif promotion.target_group == 'usuario':
+            conteos['viajes'] = como_pasajero
+        else:
+            conteos['viajes'] = como_conductor + como_pasajero
+    if promotion.min_invited_users:
+        conteos['invitados'] = _conteo(User.objects.filter(date_joined__range=vigencia), 'referred_by')
+    if not conteos:
+        return usuarios
+
+    usuarios = usuarios.alias(**conteos)
+    if promotion.min_trips:
+        usuarios = usuarios.filter(viajes__gte=promotion.min_trips)
+    if promotion.min_invited_users:
+        usuarios = usuarios.filter(invitados__gte=promotion.min_invited_users)
+    return usuarios
+
+
+def _bloquear(promotion):
+    # Los pagos de una misma promoción se serializan sobre su fila; la
+    # restricción única de Earning es la garantía final contra dobles pagos.
+    from .models import Promotion
+
+    Promotion.objects.select_for_update().filter(pk=promotion.pk).values_list('pk', flat=True).first()
+
+
+def pay_promotion(user_id, promotion):
+    """Paga el bono de ``promotion`` una sola vez; devuelve el Earning o None si ya estaba pagado."""
+    from .models import Earning
+
+    try:
+        with transaction.atomic():
+            _bloquear(promotion)
+            return Earning.objects.create(
+                user_id=user_id,
+                amount=promotion.bonus_amount,
+                earning_type='promocion',
+                related_promotion=promotion,
+                description=f"Ganancia automática por promoción: {promotion.name}",
+            )
+    except IntegrityError:
+        return None
+
+
+def award_promotion_bulk(promotion, user_ids, notes="Asignada por evaluación automática"):
+    """Asigna y paga ``promotion`` a ``user_ids`` sin pasar por las señales; devuelve cuántos eran nuevos."""
+    from .models import Earning, UserPromotion
+
+    with transaction.atomic():
+        _bloquear(promotion)
+        ya_asignados = set(
+            UserPromotion.objects.filter(promotion=promotion, user_id__in=user_ids).values_list('user_id', flat=True)
+        )
+        nuevos = [uid for uid in dict.fromkeys(user_ids) if uid not in ya_asignados]
+        if not nuevos:
+            return 0
+        UserPromotion.objects.bulk_create(
+            [UserPromotion(user_id=uid, promotion=promotion, notes=notes) for uid in nuevos],
+            ignore_conflicts=True,
+        )
+        ya_pagados = set(
+            Earning.objects.filter(
+                related_promotion=promotion, earning_type='promocion', user_id__in=nuevos,
+            ).values_list('user_id', flat=True)
+        )
+        ganancias = [
+            Earning(
+                user_id=uid,
+                amount=promotion.bonus_amount,
+                earning_type='promocion',
+                related_promotion=promotion,
+                description=f"Ganancia automática por promoción: {promotion.name}",
+            )
+            for uid in nuevos if uid not in ya_pagados
+        ]
+        Earning.objects.bulk_create(ganancias, ignore_conflicts=True)
+        # ignore_conflicts no dice qué filas se insertaron: se releen (con el
+        # bloqueo tomado, las nuevas son las que no estaban pagadas antes).
+        insertadas = Earning.objects.filter(
+            related_promotion=promotion, earning_type='promocion',
+            user_id__in=[g.user_id for g in ganancias],
+        ).only('user_id', 'amount', 'earning_type', 'created_at')
+        # bulk_create no dispara post_save: los acumulados se actualizan aquí.
+        earnings.apply_rollups(insertadas)
+    return len(nuevos)
+
+
+def evaluate_promotion(promotion, batch_size=TAMANO_LOTE, dry_run=False):
+    if not (promotion.min_trips or promotion.min_invited_users):
+        return 0
+    elegibles = eligible_users(promotion).order_by('pk').values_list('pk', flat=True)
+    total = 0
+    ultimo = 0
+    while True:
+        # Paginación por pk: los ya premiados salen del filtro pero el cursor no depende de ello.
+        lote = list(elegibles.filter(pk__gt=ultimo)[:batch_size])
+        if not lote:
+            return total
+        ultimo = lote[-1]
+        total += len(lote) if dry_run else award_promotion_bulk(promotion, lote)
+
+
+def evaluate_promotions(promotions=None, batch_size=TAMANO_LOTE, dry_run=False):
+    """Evalúa las promociones (por defecto, las activas) y devuelve {promotion_id: usuarios premiados}."""
+    if promotions is None:
+        promotions = active_promotions()
+    return {
+        promotion.pk: evaluate_promotion(promotion, batch_size=batch_size, dry_run=dry_run)
+        for promotion in promotions
+    }
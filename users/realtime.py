@@ -0,0 +1,221 @@
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+# ✅ PUB/SUB EN TIEMPO REAL
+#
+# Los canales son cadenas ("chat.<trip_id>", "trip.<trip_id>", ...) y los
+# mensajes, dicts serializables a JSON. El backend se elige con REALTIME_BROKER;
+# InProcessBroker es el sustituto local: reparte dentro del proceso ASGI, así
+# que con varios procesos hace falta un backend compartido con la misma interfaz
+# (subscribe / publish / has_subscribers). Con él gunicorn.conf.py arranca un
+# solo worker ASGI, y lo que publiquen otros procesos (`manage.py run_dispatch`,
+# el servidor WSGI) no llega a los suscriptores.
+
+TAMANO_COLA = 256
+
+
+class Subscription:
+    def __init__(self, broker, channels, maxsize=TAMANO_COLA):
+        self.broker = broker
+        self.channels = set()
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.closed = False
+        for channel in channels:
+            self.add(channel)
+
+    def add(self, channel):
+        if channel not in self.channels:
+            self.channels.add(channel)
+            self.broker._attach(channel, self)
+
+    def discard(self, channel):
+        if channel in self.channels:
+            self.channels.discard(channel)
+            self.broker._detach(channel, self)
+
+    def _deliver(self, channel, message):
+        # Se ejecuta en el loop del suscriptor. Si el cliente no consume, se
+        # descarta el mensaje más antiguo en lugar de crecer sin límite.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait((channel, message))
+
+    async def get(self):
+        return await self.queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed:
+            raise StopAsyncIteration
+        return await self.get()
+
+    def close(self):
+        self.closed = True
+        for channel in list(self.channels):
+            self.discard(channel)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, *channels):
+        # Debe llamarse desde el event loop que consumirá los mensajes.
+        return Subscription(self, channels)
+
+    def has_subscribers(self, channel):
+        return bool(self._subscribers.get(channel))
+
+    def publish(self, channel, message):
+        # Seguro desde cualquier hilo (vistas síncronas, hilos de fondo, el propio loop).
+        with self._lock:
+            subs = list(self._subscribers.get(channel, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._deliver, channel, message)
+            except RuntimeError:
+                sub.close()  # loop cerrado: suscriptor huérfano
+        return len(subs)
+
+    def _attach(self, channel, sub):
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(sub)
+
+    def _detach(self, channel, sub):
+        with self._lock:
+            subs = self._subscribers.get(channel)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[channel]
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.REALTIME_BROKER)()
+    return _broker
+
+
+def publish_chat_message(message):
+    from .serializers import ChatMessageSerializer
+
+    broker = get_broker()
+    channel = f'chat.{message.trip_id}'
+    if broker.has_subscribers(channel):
+        broker.publish(channel, dict(ChatMessageSerializer(message).data))
+
+
+def publish_trip_status(trip_id, status, driver_id=None, on_commit=True):
+    # Se publica al confirmar la transacción para no anunciar cambios revertidos.
+    # Las vistas async (autocommit, sin transacción abierta) pasan on_commit=False.
+    message = {'type': 'status', 'trip': trip_id, 'status': status, 'driver': driver_id}
+    if on_commit:
+        transaction.on_commit(lambda: get_broker().publish(f'trip.{trip_id}', message))
+    else:
+        get_broker().publish(f'trip.{trip_id}', message)
+
+
+_ultima_posicion = {}
+
+
+def publish_driver_position(driver_id, lat, lng, timestamp):
+    # Como mucho una posición cada REALTIME_POSITION_INTERVAL segundos por
+    # conductor, y sólo si alguien está escuchando.
+    channel = f'driver.{driver_id}'
+    broker = get_broker()
+    if not broker.has_subscribers(channel):
+        return False
+    ahora = time.monotonic()
+    if ahora - _ultima_posicion.get(driver_id, 0) < settings.REALTIME_POSITION_INTERVAL:
+        return False
+    _ultima_posicion[driver_id] = ahora
+    broker.publish(channel, {'type': 'position', 'driver': driver_id, 'lat': lat, 'lng': lng, 'timestamp': timestamp})
+    return True
+
+
+# ✅ AUTENTICACIÓN JWT PARA CONEXIONES ASGI (WebSocket / streams)
+
+def _user_from_validated_sync(auth, validated_token):
+    from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+    close_old_connections()
+    try:
+        return auth.get_user(validated_token)
+    except AuthenticationFailed:
+        return None
+
+
+async def user_from_token(raw_token):
+    # Devuelve un ClaimsUser (ver users/authentication.py) o None. Con claims
+    # en el token no hay consulta; los tokens antiguos consultan (con caché)
+    # fuera del loop, cerrando antes las conexiones caducadas: WebSocket/SSE
+    # viven fuera del ciclo petición/respuesta de Django.
+    from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+    from .authentication import ClaimsJWTAuthentication
+
+    auth = ClaimsJWTAuthentication()
+    try:
+        validated = auth.get_validated_token(raw_token)
+    except InvalidToken:
+        return None
+    if auth.has_claims(validated):
+        try:
+            return auth.get_user(validated)
+        except AuthenticationFailed:  # token revocado
+            return None
+    return await sync_to_async(_user_from_validated_sync)(auth, validated)
+
+
+def token_from_scope(scope):
+    # Acepta "Authorization: Bearer <token>" o ?token=<token> (los navegadores
+    # no permiten cabeceras propias al abrir un WebSocket).
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            partes = value.decode('latin1').split()
+            if len(partes) == 2 and partes[0] in settings.SIMPLE_JWT['AUTH_HEADER_TYPES']:
+                return partes[1]
+    for par in scope.get('query_string', b'').decode('latin1').split('&'):
+        clave, _, valor = par.partition('=')
+        if clave == 'token' and valor:
+            return valor
+    return None
+
+
+def token_from_request(request):
+    # Igual que token_from_scope, para vistas async (EventSource no envía cabeceras).
+    partes = request.headers.get('Authorization', '').split()
+    if len(partes) == 2 and partes[0] in settings.SIMPLE_JWT['AUTH_HEADER_TYPES']:
+        return partes[1]
+    return request.GET.get('token')
+
+
+def participant_q(user_id):
+    # Viajes en los que ``user_id`` es el pasajero o el conductor asignado.
+    return Q(passenger__user_id=user_id) | Q(driver__user_id=user_id)
+
+
+def _trip_for_participant_sync(trip_id, user_id):
+    # Devuelve (status, driver_id) si el usuario es pasajero o conductor del viaje.
+    close_old_connections()
+    from .models import Trip
+
+    return Trip.objects.filter(participant_q(user_id), id=trip_id).values_list('status', 'driver_id').first()
+
+
+trip_for_participant = sync_to_async(_trip_for_participant_sync)
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.utils import timezone
+
+from .cache import TieredCache
+
+# ✅ DATOS DE REFERENCIA CACHEADOS (Policy y promociones activas)
+#
+# Se leen en cada arranque de la app y en cada consulta de promociones, pero
+# cambian muy poco. Lectura en dos niveles (LRU del proceso y caché compartida
+# de CACHES) con dicts planos, que se guardan igual en locmem que en Redis.
+# Los receivers de models.py invalidan al guardar o borrar desde el admin;
+# otros procesos ven el cambio al expirar su LRU (REFERENCE_CACHE_TTL).
+
+GRUPOS = ('conductor', 'usuario')
+CAMPOS_PROMOCION = (
+    'id', 'name', 'description', 'bonus_amount', 'min_invited_users', 'min_trips',
+    'start_date', 'end_date', 'target_group',
+)
+
+reference_cache = TieredCache(
+    'reference',
+    maxsize=settings.REFERENCE_CACHE_SIZE,
+    ttl=settings.REFERENCE_CACHE_TTL,
+    shared_ttl=settings.REFERENCE_SHARED_CACHE_TTL,
+)
+
+
+def _cargar_politica():
+    from .models import Policy
+
+    return Policy.objects.order_by('-updated_at', '-pk').values(
+        'id', 'title', 'content', 'created_at', 'updated_at',
+    ).first()
+
+
+def _cargar_promociones(target_group):
+    # Vigentes y futuras del grupo (más las de 'todos'); el filtro por
+    # start_date se hace al leer para que una promoción que empieza no espere al TTL.
+    from .models import Promotion
+
+    promociones = Promotion.objects.filter(end_date__gte=timezone.now())
+    if target_group is not None:
+        promociones = promociones.filter(target_group__in=(target_group, 'todos'))
+    return list(promociones.order_by('start_date', 'pk').values(*CAMPOS_PROMOCION))
+
+
+def get_current_policy():
+    """Última Policy publicada (dict) o None."""
+    return reference_cache.get_or_set('policy', _cargar_politica)
+
+
+def get_active_promotions(target_group=None):
+    """Promociones vigentes para ``target_group`` ('conductor', 'usuario' o None = todas)."""
+    if target_group is not None and target_group not in GRUPOS:
+        raise ValueError(f"Grupo desconocido: {target_group!r}")
+    ahora = timezone.now()
+    promociones = reference_cache.get_or_set(f'promotions:{target_group}', lambda: _cargar_promociones(target_group))
+    return [p for p in promociones if p['start_date'] <= ahora <= p['end_date']]
+
+
+def forget_policy():
+    reference_cache.delete('policy')
+
+
+def forget_promotions():
+    for target_group in GRUPOS + (None,):
+        reference_cache.delete(f'promotions:{target_group}')
@@ -0,0 +1,245 @@
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+# ✅ GRAFO DE REFERIDOS (tabla de cierre sobre CustomUser.referred_by)
+#
+# ReferralLink guarda una fila por cada par (ancestro, descendiente) con su
+# profundidad: 1 = referido directo, 2 = referido de un referido, etc. Así los
+# conteos de invitados, el tamaño de la red de un usuario y el ranking de
+# referidores son una sola consulta sobre índices, sin recorrer el árbol.
+# Se mantiene desde las señales de CustomUser; rebuild_referral_links() /
+# `manage.py rebuild_referrals` la reconstruye desde referred_by.
+
+TAMANO_LOTE = 5000
+
+# ✅ CÓDIGOS DE REFERIDO
+#
+# El código es el id del usuario permutado con una red de Feistel de 40 bits
+# (biyectiva: dos ids nunca dan el mismo código, sin reintentos contra el
+# índice único) y escrito en base32 Crockford con 8 caracteres. La clave sale
+# de REFERRAL_CODE_KEY: cambiarla con códigos ya emitidos puede producir
+# colisiones con los antiguos.
+
+ALFABETO = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+CONFUSIONES = str.maketrans({'O': '0', 'I': '1', 'L': '1'})
+BITS_MITAD = 20
+MASCARA = (1 << BITS_MITAD) - 1
+RONDAS = 4
+LARGO_CODIGO = 8
+SIN_CODIGO = Q(referral_code__isnull=True) | Q(referral_code='')
+
+
+def _ronda(mitad, ronda):
+    clave = settings.REFERRAL_CODE_KEY.encode()
+    digest = hashlib.blake2b(f'{ronda}:{mitad}'.encode(), digest_size=4, key=clave[:64]).digest()
+    return int.from_bytes(digest, 'big') & MASCARA
+
+
+def _feistel(valor, rondas):
+    izq, der = valor >> BITS_MITAD, valor & MASCARA
+    for ronda in rondas:
+        izq, der = der, izq ^ _ronda(der, ronda)
+    return (der << BITS_MITAD) | izq
+
+
+def referral_code_for(user_id):
+    if not 0 < user_id < (1 << 2 * BITS_MITAD):
+        raise ValueError("Id fuera del rango de los códigos de referido.")
+    valor = _feistel(user_id, range(RONDAS))
+    return ''.join(ALFABETO[(valor >> (5 * i)) & 31] for i in reversed(range(LARGO_CODIGO)))
+
+
+def decode_referral_code(code):
+    # Inversa de referral_code_for: misma red con las rondas al revés.
+    code = normalize_code(code).translate(CONFUSIONES)
+    if len(code) != LARGO_CODIGO or any(c not in ALFABETO for c in code):
+        raise ValueError("Código de referido mal formado.")
+    valor = 0
+    for c in code:
+        valor = (valor << 5) | ALFABETO.index(c)
+    return _feistel(valor, reversed(range(RONDAS)))
+
+
+def normalize_code(code):
+    return (code or '').strip().upper()
+
+
+def resolve_referral_code(code):
+    """Usuario dueño de ``code`` (una consulta sobre el índice único) o None."""
+    from django.contrib.auth import get_user_model
+
+    code = normalize_code(code)
+    if not code:
+        return None
+    candidatos = {code, code.translate(CONFUSIONES)}
+    return get_user_model().objects.filter(referral_code__in=candidatos, is_active=True).first()
+
+
+def assign_referral_code(user):
+    # Tras crear el usuario (el código depende del id); no pisa códigos existentes.
+    if user.referral_code:
+        return user.referral_code
+    code = referral_code_for(user.pk)
+    type(user).objects.filter(SIN_CODIGO, pk=user.pk).update(referral_code=code)
+    user.referral_code = code
+    return code
+
+
+def backfill_referral_codes(batch_size=TAMANO_LOTE):
+    """Asigna código a los usuarios que no tienen, por lotes de ids."""
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    total = 0
+    ultimo = 0
+    while True:
+        ids = list(
+            User.objects.filter(SIN_CODIGO, pk__gt=ultimo)
+            .order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return total
+        ultimo = ids[-1]
+        User.objects.bulk_update(
+            [User(pk=pk, referral_code=referral_code_for(pk)) for pk in ids], ['referral_code'],
+        )
+        total += len(ids)
+
+
+def _links(pares):
+    from .models import ReferralLink
+
+    return [ReferralLink(ancestor_id=a, descendant_id=d, depth=p) for a, d, p in pares]
+
+
+def link_new_user(user_id, referrer_id):
+    """Enlaza un usuario nuevo (sin referidos propios) bajo ``referrer_id`` y sus ancestros."""
+    from .models import ReferralLink
+
+    ancestros = ReferralLink.objects.filter(descendant_id=referrer_id).values_list('ancestor_id', 'depth')
+    pares = [(referrer_id, user_id, 1)] + [(a, user_id, p + 1) for a, p in ancestros]
+    ReferralLink.objects.bulk_create(_links(pares), batch_size=TAMANO_LOTE)
+
+
+def is_descendant(user_id, ancestor_id):
+    from .models import ReferralLink
+
+    return ReferralLink.objects.filter(ancestor_id=ancestor_id, descendant_id=user_id).exists()
+
+
+def move_subtree(user_id, new_referrer_id):
+    """Cambia el referidor de ``user_id``: su subárbol completo se mueve con él."""
+    from .models import ReferralLink
+
+    with transaction.atomic():
+        subarbol = [(user_id, 0)] + list(
+            ReferralLink.objects.filter(ancestor_id=user_id).values_list('descendant_id', 'depth')
+        )
+        if new_referrer_id is not None and any(d == new_referrer_id for d, _ in subarbol):
+            raise ValueError("Un usuario no puede quedar referido por alguien de su propia red.")
+        # Desengancha el subárbol de los ancestros antiguos de user_id.
+        ReferralLink.objects.filter(
+            descendant_id__in=[d for d, _ in subarbol],
+            ancestor_id__in=ReferralLink.objects.filter(descendant_id=user_id).values('ancestor_id'),
+        ).delete()
+        if new_referrer_id is None:
+            return
+        ancestros = [(new_referrer_id, 0)] + list(
+            ReferralLink.objects.filter(descendant_id=new_referrer_id).values_list('ancestor_id', 'depth')
+        )
+        pares = ((a, d, pa + pd + 1) for a, pa in ancestros for d, pd in subarbol)
+        ReferralLink.objects.bulk_create(_links(pares), batch_size=TAMANO_LOTE)
+
+
+def detach_descendants(user_id):
+    # Al borrar un usuario sus referidos quedan sin referidor (SET_NULL): se
+    # quitan los enlaces de sus ancestros hacia su subárbol. Los del propio
+    # usuario se borran en cascada.
+    from .models import ReferralLink
+
+    ReferralLink.objects.filter(
+        ancestor_id__in=ReferralLink.objects.filter(descendant_id=user_id).values('ancestor_id'),
+        descendant_id__in=ReferralLink.objects.filter(ancestor_id=user_id).values('descendant_id'),
+    ).delete()
+
+
+def direct_referral_count(user_id):
+    from .models import ReferralLink
+
+    return ReferralLink.objects.filter(ancestor_id=user_id, depth=1).count()
+
+
+def subtree_size(user_id, max_depth=None):
+    from .models import ReferralLink
+
+    links = ReferralLink.objects.filter(ancestor_id=user_id)
+    if max_depth is not None:
+        links = links.filter(depth__lte=max_depth)
+    return links.count()
+
+
+def referral_chain(user_id):
+    """Ancestros de ``user_id`` del más cercano al más lejano."""
+    from .models import ReferralLink
+
+    return list(
+        ReferralLink.objects.filter(descendant_id=user_id).order_by('depth').values_list('ancestor_id', flat=True)
+    )
+
+
+def top_referrers(limit=10, depth=1):
+    """Ranking de usuarios por referidos hasta ``depth`` niveles (1 = sólo directos)."""
+    from .models import ReferralLink
+
+    return list(
+        ReferralLink.objects.filter(depth__lte=depth)
+        .values('ancestor_id', 'ancestor__username')
+        .annotate(referrals=Count('descendant_id'))
+        .order_by('-referrals', 'ancestor_id')[:limit]
+    )
+
+
+def rebuild_referral_links(batch_size=TAMANO_LOTE):
+    """Reconstruye la tabla desde referred_by, un nivel de profundidad por pasada."""
+    from django.contrib.auth import get_user_model
+
+    from .models import ReferralLink
+
+    User = get_user_model()
+    total = 0
+    with transaction.atomic():
+        ReferralLink.objects.all().delete()
+        nivel = (
+            User.objects.filter(referred_by__isnull=False)
+            .exclude(referred_by=F('pk'))
+            .values_list('referred_by_id', 'pk')
+            .order_by()
+        )
+        depth = 1
+        while True:
+            creados = 0
+            lote = []
+            for ancestro, descendiente in nivel.iterator(chunk_size=batch_size):
+                lote.append((ancestro, descendiente, depth))
+                if len(lote) >= batch_size:
+                    ReferralLink.objects.bulk_create(_links(lote))
+                    creados += len(lote)
+                    lote = []
+            ReferralLink.objects.bulk_create(_links(lote))
+            creados += len(lote)
+            if not creados:
+                return total
+            total += creados
+            # Siguiente nivel: ancestros a `depth` del referidor de cada usuario
+            # (sin cerrar ciclos heredados de datos antiguos).
+            nivel = (
+                ReferralLink.objects.filter(depth=depth, descendant__referrals__isnull=False)
+                .annotate(referido=F('descendant__referrals'))
+                .exclude(ancestor_id=F('referido'))
+                .values_list('ancestor_id', 'referido')
+                .order_by()
+            )
+            depth += 1
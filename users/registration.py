@@ -0,0 +1,119 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from .referrals import referral_code_for
+
+# ✅ REGISTRO DE USUARIOS
+#
+# Un solo camino para crear usuarios con su rol: una transacción, sin
+# comprobaciones previas. Los duplicados los detectan los índices únicos de
+# username y email, y el IntegrityError se traduce a RegistrationError
+# consultando cuál de los dos ya existe.
+
+ROLES = ('pasajero', 'conductor')
+TAMANO_LOTE = 1000
+
+
+class RegistrationError(Exception):
+    def __init__(self, field):
+        super().__init__(field)
+        self.field = field
+
+
+def _campo_duplicado(username, email):
+    # Tras el IntegrityError (transacción ya deshecha) se pregunta a la base de
+    # datos qué índice único chocó: el texto del error cambia según el motor.
+    User = get_user_model()
+    if email and User.objects.filter(email=email).exists():
+        return 'email'
+    if User.objects.filter(username=username).exists():
+        return 'username'
+    return None
+
+
+def _crear_rol(user, role):
+    from .models import Driver, Passenger
+
+    if role == 'conductor':
+        Driver.objects.create(user=user, license_number='', car_plate='')
+    elif role == 'pasajero':
+        Passenger.objects.create(user=user)
+
+
+def register_user(username, email, password, role, referred_by=None):
+    """Crea el usuario y su Driver/Passenger en una transacción; RegistrationError si ya existe."""
+    User = get_user_model()
+    try:
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username=username, email=email, password=password, referred_by=referred_by,
+            )
+            _crear_rol(user, role)
+    except IntegrityError as exc:
+        campo = _campo_duplicado(username, email)
+        if campo is None:
+            raise
+        raise RegistrationError(campo) from exc
+    return user
+
+
+def import_users(filas, role, batch_size=TAMANO_LOTE):
+    """Alta masiva de usuarios con su rol, sin señales por fila.
+
+    ``filas`` son dicts con username, email y opcionalmente password,
+    license_number y car_plate. Sin password la cuenta queda con contraseña
+    inutilizable (se activa con el flujo de recuperación). Devuelve
+    (creados, omitidos); se omiten las filas sin username y los
+    username/email ya registrados.
+    """
+    creados = omitidos = 0
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= batch_size:
+            c, o = _importar_lote(lote, role)
+            creados, omitidos, lote = creados + c, omitidos + o, []
+    if lote:
+        c, o = _importar_lote(lote, role)
+        creados, omitidos = creados + c, omitidos + o
+    return creados, omitidos
+
+
+def _importar_lote(filas, role):
+    from .models import Driver, Passenger
+
+    User = get_user_model()
+    with transaction.atomic():
+        usernames = set(
+            User.objects.filter(username__in=[f['username'] for f in filas if f['username']]).values_list('username', flat=True)
+        )
+        emails = set(
+            User.objects.filter(email__in=[f['email'] for f in filas if f['email']]).values_list('email', flat=True)
+        )
+        nuevos = []
+        for fila in filas:
+            if not fila['username'] or fila['username'] in usernames or (fila['email'] and fila['email'] in emails):
+                continue
+            usernames.add(fila['username'])
+            if fila['email']:
+                emails.add(fila['email'])
+            nuevos.append((fila, User(
+                username=fila['username'],
+                email=fila['email'],
+                password=make_password(fila.get('password') or None),
+            )))
+
+        User.objects.bulk_create([user for _, user in nuevos])
+        # bulk_create no dispara post_save: código de referido y rol se crean aquí.
+        for _, user in nuevos:
+            user.referral_code = referral_code_for(user.pk)
+        User.objects.bulk_update([user for _, user in nuevos], ['referral_code'])
+        if role == 'conductor':
+            Driver.objects.bulk_create([
+                Driver(user=user, license_number=fila.get('license_number') or '', car_plate=fila.get('car_plate') or '')
+                for fila, user in nuevos
+            ])
+        elif role == 'pasajero':
+            Passenger.objects.bulk_create([Passenger(user=user) for _, user in nuevos])
+    return len(nuevos), len(filas) - len(nuevos)
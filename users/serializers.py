@@ -1,6 +1,12 @@
+import math
+import time
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import Trip, Passenger, Driver, ChatMessage  # <-- ✅ Importamos ChatMessage
+from .realtime import publish_trip_status
+from .referrals import resolve_referral_code
+from .registration import ROLES, register_user
 
 User = get_user_model()
 
@@ -39,25 +45,84 @@ class DriverLocationUpdateSerializer(serializers.Serializer):
     lat = serializers.FloatField()
     lng = serializers.FloatField()
 
+# ✅ LOTE DE UBICACIONES: [{"lat", "lng", "timestamp"}] o [[lat, lng, timestamp]]
+# Se valida la lista completa en una sola pasada, sin un serializer por muestra.
+class DriverLocationBatchSerializer(serializers.Serializer):
+    MAX_SAMPLES = 500
+    MAX_FUTURE_SECONDS = 60
+    MAX_AGE_SECONDS = 24 * 3600  # muestras guardadas sin conexión
+
+    samples = serializers.ListField(allow_empty=False, max_length=MAX_SAMPLES)
+    trip = serializers.IntegerField(required=False, help_text="Viaje activo al que se añaden las muestras como recorrido")
+
+    def validate_samples(self, value):
+        ahora = time.time()
+        desde, limite = max(0, ahora - self.MAX_AGE_SECONDS), ahora + self.MAX_FUTURE_SECONDS
+        muestras = []
+        try:
+            for item in value:
+                if isinstance(item, dict):
+                    lat, lng, ts = item['lat'], item['lng'], item['timestamp']
+                else:
+                    lat, lng, ts = item
+                if any(isinstance(v, bool) for v in (lat, lng, ts)):
+                    raise TypeError
+                lat, lng, ts = float(lat), float(lng), float(ts)
+                # Las comparaciones con NaN son siempre falsas: se exige isfinite antes.
+                if not all(map(math.isfinite, (lat, lng, ts))):
+                    raise ValueError
+                if not (-90 <= lat <= 90 and -180 <= lng <= 180 and desde <= ts <= limite):
+                    raise ValueError
+                muestras.append((ts, lat, lng))
+        except (KeyError, TypeError, ValueError):
+            raise serializers.ValidationError(
+                f"Muestra inválida en la posición {len(muestras)}: se espera lat, lng y timestamp (epoch en segundos)."
+            )
+        muestras.sort()
+        return muestras
+
+# ✅ COTIZACIÓN DE TARIFA (una ruta o un lote en "quotes")
+class FareQuoteSerializer(serializers.Serializer):
+    origin_lat = serializers.FloatField(min_value=-90, max_value=90)
+    origin_lng = serializers.FloatField(min_value=-180, max_value=180)
+    destination_lat = serializers.FloatField(min_value=-90, max_value=90)
+    destination_lng = serializers.FloatField(min_value=-180, max_value=180)
+
+# Misma representación que Trip.fare en TripSerializer (string con 2 decimales).
+class FareQuoteResultSerializer(serializers.Serializer):
+    fare = serializers.DecimalField(max_digits=8, decimal_places=2)
+    distance_km = serializers.FloatField()
+
+class FareQuoteBatchSerializer(serializers.Serializer):
+    quotes = FareQuoteSerializer(many=True, allow_empty=False, max_length=500)
+
+# ✅ ASIGNACIÓN MASIVA DE UNA PROMOCIÓN
+class PromotionAwardSerializer(serializers.Serializer):
+    users = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=10000)
+
 class RegisterSerializer(serializers.Serializer):
     username = serializers.CharField()
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
-    role = serializers.ChoiceField(choices=['pasajero', 'conductor'])
-
-    def create(self, validated_data):
-        role = validated_data.pop('role')
-        password = validated_data.pop('password')
-        user = User(**validated_data)
-        user.set_password(password)
-        user.save()
+    role = serializers.ChoiceField(choices=ROLES)
+    referral_code = serializers.CharField(required=False, allow_blank=True, max_length=20, write_only=True)
 
-        if role == 'pasajero':
-            Passenger.objects.create(user=user)
-        elif role == 'conductor':
-            Driver.objects.create(user=user, license_number='TEMP', car_plate='TEMP')
+    def validate_referral_code(self, value):
+        if not value.strip():
+            return None
+        referidor = resolve_referral_code(value)
+        if referidor is None:
+            raise serializers.ValidationError("Código de referido inválido.")
+        return referidor
 
-        return user
+    def create(self, validated_data):
+        return register_user(
+            username=validated_data['username'],
+            email=validated_data['email'],
+            password=validated_data['password'],
+            role=validated_data['role'],
+            referred_by=validated_data.get('referral_code'),
+        )
 
 class TripStatusUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -70,6 +135,15 @@ class TripStatusUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Estado inválido.")
         return value
 
+    def update(self, instance, validated_data):
+        # PATCH sin status: no hay nada que guardar ni publicar.
+        if 'status' not in validated_data:
+            return instance
+        instance.status = validated_data['status']
+        instance.save(update_fields=['status', 'updated_at'])
+        publish_trip_status(instance.id, instance.status, instance.driver_id)
+        return instance
+
 # ✅ NUEVO SERIALIZER PARA MENSAJES DE CHAT
 class ChatMessageSerializer(serializers.ModelSerializer):
     sender_username = serializers.CharField(source='sender.username', read_only=True)
@@ -77,4 +151,5 @@ class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
         fields = ['id', 'trip', 'sender', 'sender_username', 'message', 'timestamp']
-        read_only_fields = ['id', 'timestamp', 'sender_username']
+        # El viaje sale de la URL y el remitente del token.
+        read_only_fields = ['id', 'trip', 'sender', 'timestamp', 'sender_username']
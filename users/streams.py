@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .location import location_buffer
+from .realtime import get_broker, token_from_request, trip_for_participant, user_from_token
+
+# ✅ STREAM EN VIVO DEL VIAJE (Server-Sent Events)
+#
+# GET /api/trips/<trip_id>/stream/?token=<access>
+# Envía el estado actual y luego cada cambio de estado del viaje y la posición
+# del conductor asignado (limitada por REALTIME_POSITION_INTERVAL). Es una vista
+# async: bajo ASGI cada cliente en espera sólo ocupa una corrutina, no un worker.
+# Bajo WSGI (SERVER_MODE=wsgi, el modo por defecto) el stream retendría un
+# worker síncrono hasta que acabe el viaje, así que responde 501.
+
+ESTADOS_FINALES = ('completed', 'cancelled')
+HEARTBEAT_SEGUNDOS = 15
+
+
+def _evento(data):
+    return f"event: {data['type']}\ndata: {json.dumps(data)}\n\n"
+
+
+def _ultima_posicion(driver_id):
+    pos = location_buffer.position(driver_id)
+    if pos is None:
+        return None
+    return _evento({'type': 'position', 'driver': driver_id, 'lat': pos[0], 'lng': pos[1], 'timestamp': pos[2]})
+
+
+async def trip_stream(request, trip_id):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'El stream sólo está disponible con SERVER_MODE=asgi.'}, status=501)
+    token = token_from_request(request)
+    user = await user_from_token(token) if token else None
+    if user is None:
+        return JsonResponse({'error': 'Token inválido o ausente.'}, status=401)
+    if await trip_for_participant(trip_id, user.id) is None:
+        return JsonResponse({'error': 'Viaje no encontrado.'}, status=404)
+
+    async def eventos():
+        # Se suscribe antes de releer el estado para no perder cambios intermedios.
+        subscription = get_broker().subscribe(f'trip.{trip_id}')
+        try:
+            status, conductor = await trip_for_participant(trip_id, user.id)
+            yield _evento({'type': 'status', 'trip': trip_id, 'status': status, 'driver': conductor})
+            if status in ESTADOS_FINALES:
+                return
+            if conductor is not None:
+                subscription.add(f'driver.{conductor}')
+                posicion = _ultima_posicion(conductor)
+                if posicion is not None:
+                    yield posicion
+
+            while True:
+                try:
+                    _, message = await asyncio.wait_for(subscription.get(), HEARTBEAT_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+                    continue
+                nuevo_conductor = message['type'] == 'status' and message.get('driver') != conductor
+                if nuevo_conductor:
+                    if conductor is not None:
+                        subscription.discard(f'driver.{conductor}')
+                    conductor = message.get('driver')
+                    if conductor is not None:
+                        subscription.add(f'driver.{conductor}')
+                yield _evento(message)
+                if nuevo_conductor and conductor is not None:
+                    posicion = _ultima_posicion(conductor)
+                    if posicion is not None:
+                        yield posicion
+                if message['type'] == 'status' and message['status'] in ESTADOS_FINALES:
+                    return
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,3 +1,336 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.test import AsyncClient, SimpleTestCase, TestCase
+from django.utils import timezone
+
+from . import earnings, referrals
+from .models import ChatMessage, Driver, Earning, EarningRollup, Passenger, Promotion, ReferralLink, Trip
+from .promotions import eligible_users
+from .serializers import DriverLocationBatchSerializer, FareQuoteResultSerializer
+from .tokens import token_payload
+from .trails import decode_points, encode_points
+
+
+# ✅ RECORRIDO GPS: codificación delta + zigzag + varint
+class TrailEncodingTests(SimpleTestCase):
+    def test_round_trip_con_deltas_negativos(self):
+        puntos = [
+            (1_700_000_000, 4.609710, -74.081750),
+            (1_700_000_003, 4.609100, -74.082300),  # lat y lng bajan
+            (1_700_000_004, -0.000001, 0.000001),   # cruza el ecuador y el meridiano
+            (1_700_000_300, -33.448890, -70.669265),
+            (1_700_000_301, 89.999999, 179.999999),
+        ]
+        blob, _ = encode_points(puntos)
+        self.assertEqual(list(decode_points(blob)), puntos)
+
+    def test_continuar_desde_el_ultimo_punto(self):
+        puntos = [(100 + i, 4.6 - i * 0.0001, -74.1 + i * 0.0002) for i in range(50)]
+        primero, ultimo = encode_points(puntos[:20])
+        resto, _ = encode_points(puntos[20:], ultimo)
+        completo, _ = encode_points(puntos)
+        self.assertEqual(primero + resto, completo)
+        decodificados = list(decode_points(primero + resto))
+        self.assertEqual([ts for ts, _, _ in decodificados], [ts for ts, _, _ in puntos])
+        for (_, lat, lng), (_, lat_esperada, lng_esperada) in zip(decodificados, puntos):
+            self.assertAlmostEqual(lat, lat_esperada, places=6)
+            self.assertAlmostEqual(lng, lng_esperada, places=6)
+
+    def test_blob_vacio(self):
+        self.assertEqual(list(decode_points(b'')), [])
+
+
+# ✅ RED DE REFERIDOS (tabla de cierre)
+class ReferralClosureTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        # a -> b -> c -> d  y  e suelto
+        self.a = User.objects.create_user(username='a', email='a@x.co')
+        self.b = User.objects.create_user(username='b', email='b@x.co', referred_by=self.a)
+        self.c = User.objects.create_user(username='c', email='c@x.co', referred_by=self.b)
+        self.d = User.objects.create_user(username='d', email='d@x.co', referred_by=self.c)
+        self.e = User.objects.create_user(username='e', email='e@x.co')
+
+    def enlaces(self):
+        return set(ReferralLink.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def test_enlaces_al_crear(self):
+        a, b, c, d = (u.pk for u in (self.a, self.b, self.c, self.d))
+        self.assertEqual(self.enlaces(), {
+            (a, b, 1), (a, c, 2), (a, d, 3),
+            (b, c, 1), (b, d, 2),
+            (c, d, 1),
+        })
+        self.assertEqual(referrals.referral_chain(d), [c, b, a])
+        self.assertEqual(referrals.subtree_size(a), 3)
+
+    def test_mover_subarbol(self):
+        # c (con d debajo) pasa de b a e.
+        self.c.referred_by = self.e
+        self.c.save()
+        a, b, c, d, e = (u.pk for u in (self.a, self.b, self.c, self.d, self.e))
+        self.assertEqual(self.enlaces(), {
+            (a, b, 1),
+            (e, c, 1), (e, d, 2),
+            (c, d, 1),
+        })
+        self.assertEqual(referrals.subtree_size(a), 1)
+        self.assertEqual(referrals.referral_chain(d), [c, e])
+
+    def test_quitar_referidor(self):
+        self.c.referred_by = None
+        self.c.save()
+        self.assertEqual(referrals.referral_chain(self.d.pk), [self.c.pk])
+        self.assertEqual(referrals.subtree_size(self.a.pk), 1)
+
+    def test_rechaza_ciclos(self):
+        antes = self.enlaces()
+        with self.assertRaises(ValueError):
+            referrals.move_subtree(self.b.pk, self.d.pk)
+        self.assertEqual(self.enlaces(), antes)
+
+        self.a.referred_by = self.d
+        with self.assertRaises(ValidationError):
+            self.a.full_clean()
+        self.a.referred_by = self.a
+        with self.assertRaises(ValidationError):
+            self.a.full_clean()
+
+    def test_rebuild_reproduce_la_tabla(self):
+        self.c.referred_by = self.e
+        self.c.save()
+        antes = self.enlaces()
+        referrals.rebuild_referral_links()
+        self.assertEqual(self.enlaces(), antes)
+
+
+# ✅ CÓDIGOS DE REFERIDO (Feistel + base32)
+class ReferralCodeTests(SimpleTestCase):
+    def test_round_trip(self):
+        tope = (1 << 2 * referrals.BITS_MITAD) - 1
+        ids = [*range(1, 5001), *range(tope - 1000, tope + 1), 1 << 20, (1 << 20) - 1]
+        codigos = set()
+        for user_id in ids:
+            code = referrals.referral_code_for(user_id)
+            self.assertEqual(len(code), referrals.LARGO_CODIGO)
+            self.assertEqual(referrals.decode_referral_code(code), user_id)
+            codigos.add(code)
+        self.assertEqual(len(codigos), len(ids))
+
+    def test_decodifica_minusculas_y_confusiones(self):
+        code = referrals.referral_code_for(42)
+        self.assertEqual(referrals.decode_referral_code(code.lower()), 42)
+        tramposo = code.replace('0', 'O').replace('1', 'I')
+        self.assertEqual(referrals.decode_referral_code(tramposo), 42)
+
+    def test_rechaza_ids_y_codigos_invalidos(self):
+        for user_id in (0, -1, 1 << 2 * referrals.BITS_MITAD):
+            with self.assertRaises(ValueError):
+                referrals.referral_code_for(user_id)
+        for code in ('', 'ABC', 'ABCDEFGHU', 'ABCD-EFG'):
+            with self.assertRaises(ValueError):
+                referrals.decode_referral_code(code)
+
+
+# ✅ LOTE DE UBICACIONES
+class DriverLocationBatchTests(SimpleTestCase):
+    def validar(self, *muestras):
+        return DriverLocationBatchSerializer(data={'samples': list(muestras)})
+
+    def test_acepta_y_ordena_por_timestamp(self):
+        ahora = time.time()
+        serializer = self.validar(
+            {'lat': 4.6, 'lng': -74.08, 'timestamp': ahora},
+            [4.5, -74.1, ahora - 60],
+            ['4.4', '-74.2', str(ahora - 120)],
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual([m[0] for m in serializer.validated_data['samples']], [ahora - 120, ahora - 60, ahora])
+
+    def test_rechaza_muestras_invalidas(self):
+        ahora = time.time()
+        casos = {
+            'lat nan': [float('nan'), -74.0, ahora],
+            'lng nan': [4.6, 'nan', ahora],
+            'lat infinita': ['inf', -74.0, ahora],
+            'timestamp nan': [4.6, -74.0, float('nan')],
+            'timestamp infinito': [4.6, -74.0, '-inf'],
+            'lat booleana': [True, -74.0, ahora],
+            'timestamp booleano': {'lat': 4.6, 'lng': -74.0, 'timestamp': True},
+            'timestamp negativo': [4.6, -74.0, -1],
+            'timestamp antiguo': [4.6, -74.0, ahora - DriverLocationBatchSerializer.MAX_AGE_SECONDS - 60],
+            'timestamp futuro': [4.6, -74.0, ahora + DriverLocationBatchSerializer.MAX_FUTURE_SECONDS + 60],
+            'lat fuera de rango': [90.5, -74.0, ahora],
+            'lng fuera de rango': [4.6, 180.5, ahora],
+            'sin timestamp': {'lat': 4.6, 'lng': -74.0},
+            'texto': ['a', -74.0, ahora],
+        }
+        for nombre, muestra in casos.items():
+            with self.subTest(nombre):
+                serializer = self.validar([4.6, -74.0, ahora], muestra)
+                self.assertFalse(serializer.is_valid())
+                self.assertIn('posición 1', str(serializer.errors['samples']))
+
+
+# ✅ COTIZACIÓN DE TARIFA
+class FareQuoteResultTests(SimpleTestCase):
+    def test_tarifa_como_string_igual_que_trip(self):
+        data = FareQuoteResultSerializer({'fare': Decimal('12.5'), 'distance_km': 3.25}).data
+        self.assertEqual(data, {'fare': '12.50', 'distance_km': 3.25})
+
+
+# ✅ ACCESO SÓLO PARA PASAJERO Y CONDUCTOR DEL VIAJE
+class TripParticipantAccessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.pasajero = User.objects.create_user(username='pasajero', email='p@x.co')
+        cls.conductor = User.objects.create_user(username='conductor', email='c@x.co')
+        cls.extrano = User.objects.create_user(username='extrano', email='e@x.co')
+        Passenger.objects.create(user=cls.extrano)
+        cls.trip = Trip.objects.create(
+            passenger=Passenger.objects.create(user=cls.pasajero),
+            driver=Driver.objects.create(user=cls.conductor, license_number='', car_plate=''),
+            origin_lat=4.60, origin_lng=-74.08, destination_lat=4.65, destination_lng=-74.05,
+        )
+        ChatMessage.objects.create(trip=cls.trip, sender=cls.pasajero, message='hola')
+        cls.tokens = {u.pk: token_payload(u)['access'] for u in (cls.pasajero, cls.conductor, cls.extrano)}
+
+    def auth(self, user):
+        return {'Authorization': f'Bearer {self.tokens[user.pk]}'}
+
+    def test_chat_participantes(self):
+        url = f'/api/chats/{self.trip.id}/'
+        for user in (self.pasajero, self.conductor):
+            with self.subTest(user.username):
+                respuesta = self.client.get(url, headers=self.auth(user))
+                self.assertEqual(respuesta.status_code, 200)
+                respuesta = self.client.post(url, {'message': 'ok'}, headers=self.auth(user))
+                self.assertEqual(respuesta.status_code, 201)
+
+    def test_chat_ajeno_da_404(self):
+        url = f'/api/chats/{self.trip.id}/'
+        self.assertEqual(self.client.get(url, headers=self.auth(self.extrano)).status_code, 404)
+        respuesta = self.client.post(url, {'message': 'spam'}, headers=self.auth(self.extrano))
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertFalse(ChatMessage.objects.filter(sender=self.extrano).exists())
+
+    async def test_chat_async_ajeno_da_404(self):
+        client = AsyncClient()
+        url = f'/api/async/chats/{self.trip.id}/'
+        extrano, pasajero = self.auth(self.extrano), self.auth(self.pasajero)
+        self.assertEqual((await client.get(url, headers=extrano)).status_code, 404)
+        respuesta = await client.post(url, {'message': 'spam'}, content_type='application/json', headers=extrano)
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertEqual((await client.get(url, headers=pasajero)).status_code, 200)
+        self.assertFalse(await ChatMessage.objects.filter(sender=self.extrano).aexists())
+
+    def test_estado_ajeno_da_404(self):
+        for url in (f'/api/trips/{self.trip.id}/status/', f'/api/async/trips/{self.trip.id}/status/'):
+            with self.subTest(url):
+                respuesta = self.client.patch(
+                    url, {'status': 'cancelled'}, content_type='application/json', headers=self.auth(self.extrano),
+                )
+                self.assertEqual(respuesta.status_code, 404)
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.status, 'pending')
+
+    def test_estado_participante(self):
+        respuesta = self.client.patch(
+            f'/api/trips/{self.trip.id}/status/', {'status': 'in_progress'},
+            content_type='application/json', headers=self.auth(self.conductor),
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.status, 'in_progress')
+
+
+# ✅ USUARIOS ELEGIBLES PARA UNA PROMOCIÓN
+class EligibleUsersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.conductor = User.objects.create_user(username='conductor', email='c@x.co')
+        driver = Driver.objects.create(user=cls.conductor, license_number='', car_plate='')
+        pasajero = Passenger.objects.create(user=User.objects.create_user(username='pasajero', email='p@x.co'))
+        # 3 viajes completados y 2 referidos: con un JOIN común serían 6 filas por conteo.
+        for status in ('completed', 'completed', 'completed', 'cancelled'):
+            Trip.objects.create(
+                passenger=pasajero, driver=driver, status=status,
+                origin_lat=4.60, origin_lng=-74.08, destination_lat=4.65, destination_lng=-74.05,
+            )
+        for i in range(2):
+            User.objects.create_user(username=f'ref{i}', email=f'r{i}@x.co', referred_by=cls.conductor)
+
+    def promocion(self, **requisitos):
+        ahora = timezone.now()
+        return Promotion.objects.create(
+            name='bono', description='', bonus_amount=Decimal('10'), target_group='conductor',
+            start_date=ahora - timedelta(days=1), end_date=ahora + timedelta(days=1), **requisitos,
+        )
+
+    def test_cuenta_cada_relacion_por_separado(self):
+        self.assertIn(self.conductor, eligible_users(self.promocion(min_trips=3, min_invited_users=2)))
+        self.assertNotIn(self.conductor, eligible_users(self.promocion(min_trips=4, min_invited_users=2)))
+        self.assertNotIn(self.conductor, eligible_users(self.promocion(min_trips=3, min_invited_users=3)))
+
+    def test_viajes_como_pasajero(self):
+        pasajero = get_user_model().objects.get(username='pasajero')
+        promocion = self.promocion(min_trips=1)
+        promocion.target_group = 'usuario'
+        self.assertIn(pasajero, eligible_users(promocion))
+        promocion.min_trips = 4
+        self.assertNotIn(pasajero, eligible_users(promocion))
+
+
+# ✅ ACUMULADOS DE GANANCIAS
+class EarningRollupTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='u', email='u@x.co')
+
+    def acumulados(self):
+        return set(EarningRollup.objects.values_list('period', 'earning_type', 'total', 'count'))
+
+    def test_editar_aplica_la_diferencia(self):
+        earning = Earning.objects.create(user=self.user, amount=Decimal('10'), earning_type='viaje')
+        Earning.objects.create(user=self.user, amount=Decimal('5'), earning_type='viaje')
+        earning.amount = Decimal('12.50')
+        earning.save()
+        self.assertEqual(self.acumulados(), {
+            ('day', 'viaje', Decimal('17.50'), 2), ('week', 'viaje', Decimal('17.50'), 2),
+        })
+
+        earning.earning_type = 'otro'
+        earning.save()
+        self.assertEqual(self.acumulados(), {
+            ('day', 'viaje', Decimal('5'), 1), ('week', 'viaje', Decimal('5'), 1),
+            ('day', 'otro', Decimal('12.50'), 1), ('week', 'otro', Decimal('12.50'), 1),
+        })
+
+    def test_cambio_de_periodo_borra_el_acumulado_vacio(self):
+        earning = Earning.objects.create(user=self.user, amount=Decimal('10'), earning_type='viaje')
+        earning.created_at -= timedelta(days=14)
+        earning.save()
+        inicio = earnings.period_start(earning.created_at, 'week')
+        self.assertEqual(
+            list(EarningRollup.objects.filter(period='week').values_list('period_start', 'total', 'count')),
+            [(inicio, Decimal('10'), 1)],
+        )
+        self.assertEqual(EarningRollup.objects.count(), 2)
+
+    def test_borrar_deja_sin_filas(self):
+        for monto in ('1', '2'):
+            Earning.objects.create(user=self.user, amount=Decimal(monto), earning_type='viaje')
+        Earning.objects.filter(user=self.user).first().delete()
+        self.assertEqual(EarningRollup.objects.filter(count=1).count(), 2)
+        Earning.objects.filter(user=self.user).delete()
+        self.assertFalse(EarningRollup.objects.exists())
+
+    def test_lote_restado_borra_vacios(self):
+        lote = [Earning.objects.create(user=self.user, amount=Decimal('3'), earning_type=t) for t in ('viaje', 'otro')]
+        earnings.apply_rollups(lote, sign=-1)
+        self.assertFalse(EarningRollup.objects.exists())
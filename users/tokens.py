@@ -0,0 +1,75 @@
+from django.conf import settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .authentication import load_claims, user_claims
+
+# ✅ EMISIÓN DE TOKENS CON ROL
+#
+# Todos los caminos que entregan tokens (login, /api/token/, /api/token/refresh/
+# y el registro de rol) embeben los claims de users/authentication.py: rol,
+# driver_id, passenger_id y flags de staff. Al refrescar se releen de la base
+# de datos, así un cambio de rol llega como mucho en la vida de un access token,
+# que para estos tokens es AUTH_CLAIMS_ACCESS_LIFETIME.
+
+
+class ClaimsAccessToken(AccessToken):
+    lifetime = settings.AUTH_CLAIMS_ACCESS_LIFETIME
+
+
+class ClaimsRefreshToken(RefreshToken):
+    access_token_class = ClaimsAccessToken
+
+
+def issue_tokens(user):
+    """RefreshToken de ``user`` con sus claims (el access token derivado los hereda)."""
+    refresh = ClaimsRefreshToken.for_user(user)
+    for clave, valor in user_claims(user).items():
+        refresh[clave] = valor
+    return refresh
+
+
+def _datos_usuario(user, token):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'role': token['role'],
+        'driver_id': token['driver_id'],
+        'passenger_id': token['passenger_id'],
+    }
+
+
+def token_payload(user):
+    refresh = issue_tokens(user)
+    return {'refresh': str(refresh), 'access': str(refresh.access_token), 'user': _datos_usuario(user, refresh)}
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    # Configurado en SIMPLE_JWT['TOKEN_OBTAIN_SERIALIZER'] (vista de /api/token/).
+    @classmethod
+    def get_token(cls, user):
+        return issue_tokens(user)
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        data['user'] = _datos_usuario(self.user, ClaimsAccessToken(data['access']))
+        return data
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    # Configurado en SIMPLE_JWT['TOKEN_REFRESH_SERIALIZER'] (vista de /api/token/refresh/).
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = ClaimsAccessToken(data['access'])
+        claims = load_claims(access[api_settings.USER_ID_CLAIM])
+        if claims is None:
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        for clave, valor in claims.items():
+            access[clave] = valor
+        data['access'] = str(access)
+        return data
@@ -0,0 +1,137 @@
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Func, Value
+from django.utils import timezone
+
+from .geo import haversine_km
+
+# ✅ RECORRIDO GPS COMPACTO POR VIAJE
+#
+# Cada punto se guarda como tres enteros (timestamp en segundos, lat y lng en
+# micro-grados) codificados como diferencia respecto al punto anterior, en
+# zigzag + varint. Un ping típico cada pocos segundos ocupa 4-6 bytes.
+# El blob es append-only: sólo se aceptan puntos posteriores al último guardado.
+
+MICRO = 1_000_000
+
+
+class _AppendBytes(Func):
+    # data || blob en la propia base de datos: el recorrido no se lee ni se
+    # reescribe entero en cada lote (bytea || bytea en PostgreSQL; en SQLite
+    # || devuelve texto y se vuelve a convertir a BLOB).
+    arg_joiner = ' || '
+    template = '(%(expressions)s)'
+    output_field = models.BinaryField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='CAST((%(expressions)s) AS BLOB)', **extra_context)
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+def _write_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def encode_points(points, last=None):
+    """Codifica ``points`` [(ts, lat, lng)] a partir del último punto ``last`` (ts, lat_e6, lng_e6)."""
+    out = bytearray()
+    prev_ts, prev_lat, prev_lng = last if last is not None else (0, 0, 0)
+    for ts, lat, lng in points:
+        ts, lat, lng = int(ts), round(lat * MICRO), round(lng * MICRO)
+        _write_varint(out, _zigzag(ts - prev_ts))
+        _write_varint(out, _zigzag(lat - prev_lat))
+        _write_varint(out, _zigzag(lng - prev_lng))
+        prev_ts, prev_lat, prev_lng = ts, lat, lng
+    return bytes(out), (prev_ts, prev_lat, prev_lng)
+
+
+def decode_points(data):
+    # Generador: produce (ts, lat, lng) sin materializar todo el recorrido.
+    valores = [0, 0, 0]
+    campo = 0
+    n = shift = 0
+    for byte in data:
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        valores[campo] += _unzigzag(n)
+        n = shift = 0
+        campo += 1
+        if campo == 3:
+            campo = 0
+            yield valores[0], valores[1] / MICRO, valores[2] / MICRO
+
+
+def append_points(trip_id, points):
+    """Añade ``points`` [(ts, lat, lng)] ordenados al recorrido del viaje; devuelve cuántos se guardaron."""
+    from .models import TripTrail
+
+    with transaction.atomic():
+        trail = _lock_trail(TripTrail, trip_id)
+        if trail.point_count:
+            last = (trail.last_ts, trail.last_lat_e6, trail.last_lng_e6)
+            nuevos = [p for p in points if int(p[0]) > trail.last_ts]
+        else:
+            last = None
+            nuevos = list(points)
+        if not nuevos:
+            return 0
+
+        distancia = 0.0
+        if last is not None:
+            prev = (last[1] / MICRO, last[2] / MICRO)
+        else:
+            prev = (nuevos[0][1], nuevos[0][2])
+        for _, lat, lng in nuevos:
+            distancia += haversine_km(prev[0], prev[1], lat, lng)
+            prev = (lat, lng)
+
+        blob, (last_ts, last_lat_e6, last_lng_e6) = encode_points(nuevos, last)
+        TripTrail.objects.filter(pk=trip_id).update(
+            data=_AppendBytes(F('data'), Value(blob, output_field=models.BinaryField())),
+            point_count=F('point_count') + len(nuevos),
+            distance_km=F('distance_km') + distancia,
+            last_ts=last_ts,
+            last_lat_e6=last_lat_e6,
+            last_lng_e6=last_lng_e6,
+            updated_at=timezone.now(),
+        )
+    return len(nuevos)
+
+
+def _lock_trail(TripTrail, trip_id):
+    # Bloquea la fila del recorrido (sin cargar el blob) y la crea si no existe.
+    campos = ('point_count', 'last_ts', 'last_lat_e6', 'last_lng_e6')
+    trail = TripTrail.objects.select_for_update().filter(pk=trip_id).only(*campos).first()
+    if trail is None:
+        try:
+            with transaction.atomic():
+                TripTrail.objects.create(trip_id=trip_id)
+        except IntegrityError:
+            pass  # lo creó otra petición a la vez
+        trail = TripTrail.objects.select_for_update().filter(pk=trip_id).only(*campos).get()
+    return trail
+
+
+def read_points(trip_id, since=None, until=None):
+    from .models import TripTrail
+
+    data = TripTrail.objects.filter(trip_id=trip_id).values_list('data', flat=True).first()
+    if not data:
+        return
+    for ts, lat, lng in decode_points(bytes(data)):
+        if since is not None and ts < since:
+            continue
+        if until is not None and ts > until:
+            break
+        yield ts, lat, lng
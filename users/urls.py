@@ -1,4 +1,7 @@
 from django.urls import path
+
+from .async_views import login_async, update_location_async, chat_async, trip_status_async
+from .streams import trip_stream
 from .views import (
     protected_view,
     register_view,
@@ -8,8 +11,19 @@ from .views import (
     TripListCreateView,
     assign_driver_to_trip,
     UpdateDriverLocationView,
+    UpdateDriverLocationBatchView,
     TripStatusUpdateView,
     ChatMessageListCreateView,
+    NearbyDriversView,
+    TripTrailView,
+    FareQuoteView,
+    cache_stats_view,
+    current_policy_view,
+    active_promotions_view,
+    EarningPeriodsView,
+    PromotionAwardView,
+    referral_summary_view,
+    top_referrers_view,
     login_view
 )
 
@@ -24,9 +38,37 @@ urlpatterns = [
     path('trips/', TripListCreateView.as_view(), name='trip-list-create'),
     path('trips/<int:trip_id>/assign_driver/', assign_driver_to_trip, name='assign-driver-to-trip'),
     path('driver/update-location/', UpdateDriverLocationView.as_view(), name='update_driver_location'),
+    path('driver/update-location/batch/', UpdateDriverLocationBatchView.as_view(), name='update_driver_location_batch'),
+    path('trips/<int:trip_id>/nearby-drivers/', NearbyDriversView.as_view(), name='trip-nearby-drivers'),
+    path('trips/<int:trip_id>/trail/', TripTrailView.as_view(), name='trip-trail'),
+    path('trips/<int:trip_id>/stream/', trip_stream, name='trip-stream'),
     path('trips/<int:pk>/status/', TripStatusUpdateView.as_view(), name='trip-status-update'),  
     path('chats/<int:trip_id>/', ChatMessageListCreateView.as_view(), name='chat-messages'),
 
+    # Tarifas
+    path('fare/quote/', FareQuoteView.as_view(), name='fare-quote'),
+
+    # Ganancias
+    path('earnings/periods/', EarningPeriodsView.as_view(), name='earning-periods'),
+    path('promotions/active/', active_promotions_view, name='promotions-active'),
+    path('promotions/<int:promotion_id>/award/', PromotionAwardView.as_view(), name='promotion-award'),
+
+    # Referidos
+    path('referrals/summary/', referral_summary_view, name='referral-summary'),
+    path('referrals/top/', top_referrers_view, name='referral-top'),
+
+    # Políticas
+    path('policy/', current_policy_view, name='policy-current'),
+
+    # Métricas internas
+    path('cache/stats/', cache_stats_view, name='cache-stats'),
+
     # Login
     path('login/', login_view, name='login_user'),
+
+    # Versiones async (para el modo ASGI)
+    path('async/login/', login_async, name='login_user_async'),
+    path('async/driver/update-location/', update_location_async, name='update_driver_location_async'),
+    path('async/chats/<int:trip_id>/', chat_async, name='chat-messages-async'),
+    path('async/trips/<int:pk>/status/', trip_status_async, name='trip-status-update-async'),
 ]
@@ -1,15 +1,38 @@
+import math
+
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model, authenticate
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
-from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import Trip, ChatMessage, Driver, Passenger
+from .models import Trip, ChatMessage, Driver, Passenger, Promotion
+from .geo import nearest_drivers
+from .dispatch import claim_trip
+from .location import location_buffer
+from .trails import append_points, read_points
+from .fares import quote_fares
+from .cache import cache_stats
+from .pagination import TripPagination, ChatMessagePagination
+from .realtime import participant_q, publish_trip_status
+from .earnings import PERIODOS, period_history
+from .promotions import award_promotion_bulk
+from .registration import RegistrationError
+from .reference import get_active_promotions, get_current_policy
+from .referrals import direct_referral_count, subtree_size, top_referrers
+from .tokens import token_payload
 from .serializers import (
     TripSerializer,
     DriverLocationUpdateSerializer,
+    DriverLocationBatchSerializer,
+    FareQuoteSerializer,
+    FareQuoteBatchSerializer,
+    FareQuoteResultSerializer,
+    PromotionAwardSerializer,
     TripStatusUpdateSerializer,
     ChatMessageSerializer,
     RegisterSerializer,
@@ -32,35 +55,14 @@ def login_view(request):
     if not email or not password:
         return Response({'error': 'Se requieren email y contraseña.'}, status=400)
 
-    User = get_user_model()
-    try:
-        user = User.objects.get(email=email)
-    except User.DoesNotExist:
-        return Response({'error': 'Correo no registrado.'}, status=404)
-
-    user = authenticate(username=user.username, password=password)
-
+    user = authenticate(request, email=email, password=password)
     if user is not None:
-        refresh = RefreshToken.for_user(user)
-
-        role = 'desconocido'
-        if hasattr(user, 'driver'):
-            role = 'conductor'
-        elif hasattr(user, 'passenger'):
-            role = 'pasajero'
+        return Response(token_payload(user), status=200)
 
-        return Response({
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': role
-            }
-        }, status=200)
-    else:
-        return Response({'error': 'Contraseña incorrecta.'}, status=401)
+    # Sólo en el camino de error: distingue correo inexistente de contraseña incorrecta.
+    if not get_user_model().objects.filter(email=email).exists():
+        return Response({'error': 'Correo no registrado.'}, status=404)
+    return Response({'error': 'Contraseña incorrecta.'}, status=401)
 
 
 # ✅ REGISTRO DE USUARIO BASE CON EMAIL Y ROL
@@ -69,24 +71,13 @@ def login_view(request):
 def register_view(request):
     serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
-        username = serializer.validated_data['username']
-        password = serializer.validated_data['password']
-        email = serializer.validated_data['email']
         role = serializer.validated_data['role']
-
-        User = get_user_model()
-
-        if User.objects.filter(username=username).exists():
+        try:
+            user = serializer.save()
+        except RegistrationError as exc:
+            if exc.field == 'email':
+                return Response({'error': 'Este correo ya está registrado. Inicia sesión.'}, status=400)
             return Response({'error': 'Este nombre de usuario ya está registrado. Inicia sesión.'}, status=400)
-        if User.objects.filter(email=email).exists():
-            return Response({'error': 'Este correo ya está registrado. Inicia sesión.'}, status=400)
-
-        user = User.objects.create_user(username=username, email=email, password=password)
-
-        if role == 'conductor':
-            Driver.objects.create(user=user)
-        elif role == 'pasajero':
-            Passenger.objects.create(user=user)
 
         return Response({
             'message': 'Usuario registrado correctamente.',
@@ -94,7 +85,8 @@ def register_view(request):
                 'id': user.id,
                 'username': user.username,
                 'email': user.email,
-                'role': role
+                'role': role,
+                'referral_code': user.referral_code,
             }
         }, status=status.HTTP_201_CREATED)
 
@@ -105,30 +97,36 @@ def register_view(request):
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def register_driver(request):
-    user = request.user
-    if hasattr(user, 'driver'):
+    try:
+        with transaction.atomic():
+            Driver.objects.create(user_id=request.user.id)
+    except IntegrityError:
         return Response({'error': 'Este usuario ya es un conductor.'}, status=400)
-    Driver.objects.create(user=user)
-    return Response({'message': 'Conductor registrado correctamente.'})
+    # Tokens nuevos: los anteriores no llevan el rol recién creado.
+    user = get_user_model().objects.select_related('driver', 'passenger').get(pk=request.user.id)
+    return Response({'message': 'Conductor registrado correctamente.', **token_payload(user)})
 
 
 # ✅ REGISTRO DE PASAJERO
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def register_passenger(request):
-    user = request.user
-    if hasattr(user, 'passenger'):
+    try:
+        with transaction.atomic():
+            Passenger.objects.create(user_id=request.user.id)
+    except IntegrityError:
         return Response({'error': 'Este usuario ya es un pasajero.'}, status=400)
-    Passenger.objects.create(user=user)
-    return Response({'message': 'Pasajero registrado correctamente.'})
+    # Tokens nuevos: los anteriores no llevan el rol recién creado.
+    user = get_user_model().objects.select_related('driver', 'passenger').get(pk=request.user.id)
+    return Response({'message': 'Pasajero registrado correctamente.', **token_payload(user)})
 
 
 # ✅ ESTADO DE CONDUCTOR
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def check_driver_status(request):
-    user = request.user
-    is_driver = hasattr(user, 'driver')
+    # Se consulta la base de datos: el claim del token puede ser anterior al registro.
+    is_driver = Driver.objects.filter(user_id=request.user.id).exists()
     return Response({'is_driver': is_driver})
 
 
@@ -136,58 +134,305 @@ def check_driver_status(request):
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def assign_driver_to_trip(request, trip_id):
-    try:
-        trip = Trip.objects.get(id=trip_id)
-        driver = request.user.driver
-        if trip.driver is not None:
-            return Response({'error': 'Este viaje ya tiene un conductor asignado.'}, status=400)
-        trip.driver = driver
-        trip.save()
+    driver_id = request.user.driver_id
+    if driver_id is None:
+        return Response({'error': 'Este usuario no es un conductor.'}, status=400)
+
+    if claim_trip(trip_id, driver_id):
+        publish_trip_status(trip_id, 'assigned', driver_id)
         return Response({'message': 'Conductor asignado al viaje.'})
-    except Trip.DoesNotExist:
+
+    trip = Trip.objects.filter(id=trip_id).values('driver_id', 'status').first()
+    if trip is None:
         return Response({'error': 'Viaje no encontrado.'}, status=404)
-    except AttributeError:
-        return Response({'error': 'Este usuario no es un conductor.'}, status=400)
+    if trip['driver_id'] is None and trip['status'] == 'pending':
+        return Response({'error': 'Este conductor ya tiene un viaje activo.'}, status=400)
+    return Response({'error': 'Este viaje ya tiene un conductor asignado.'}, status=400)
 
 
 # ✅ LISTA Y CREA VIAJES
+# Cada usuario ve sólo sus viajes (como pasajero y/o conductor). Con ?open=1 un
+# conductor ve los viajes pendientes sin conductor que puede tomar.
 class TripListCreateView(generics.ListCreateAPIView):
-    queryset = Trip.objects.all().order_by('-created_at')
     serializer_class = TripSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TripPagination
+
+    def get_queryset(self):
+        qs = Trip.objects.select_related('passenger__user', 'driver__user').order_by('-created_at')
+        passenger_id, driver_id = self.request.user.passenger_id, self.request.user.driver_id
+
+        if self.request.query_params.get('open') and driver_id is not None:
+            return qs.filter(status='pending', driver__isnull=True)
+
+        if passenger_id is None and driver_id is None:
+            return qs.none()
+        if driver_id is None:
+            return qs.filter(passenger_id=passenger_id)
+        if passenger_id is None:
+            return qs.filter(driver_id=driver_id)
+        return qs.filter(Q(passenger_id=passenger_id) | Q(driver_id=driver_id))
 
     def perform_create(self, serializer):
-        serializer.save(passenger=self.request.user.passenger)
+        if self.request.user.passenger_id is None:
+            raise ValidationError({'error': 'Este usuario no es un pasajero.'})
+        serializer.save(passenger=Passenger(id=self.request.user.passenger_id, user_id=self.request.user.id))
 
 
 # ✅ ACTUALIZAR ESTADO DEL VIAJE
 class TripStatusUpdateView(generics.UpdateAPIView):
-    queryset = Trip.objects.all()
     serializer_class = TripStatusUpdateSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        # Igual que trip_status_async: sólo el pasajero o el conductor del viaje.
+        return Trip.objects.filter(participant_q(self.request.user.id))
+
 
 # ✅ ACTUALIZAR UBICACIÓN DEL CONDUCTOR
+# La posición queda en el buffer en memoria; se guarda en Driver en lotes.
 class UpdateDriverLocationView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
         serializer = DriverLocationUpdateSerializer(data=request.data)
         if serializer.is_valid():
-            driver = request.user.driver
-            driver.current_lat = serializer.validated_data['lat']
-            driver.current_lng = serializer.validated_data['lng']
-            driver.save()
+            conductor = location_buffer.driver_for_user(request.user.id)
+            if conductor is None:
+                return Response({'error': 'Este usuario no es un conductor.'}, status=400)
+            driver_id, is_approved = conductor
+            location_buffer.ingest(
+                driver_id,
+                serializer.validated_data['lat'],
+                serializer.validated_data['lng'],
+                is_approved=is_approved,
+            )
             return Response({'message': 'Ubicación actualizada correctamente'})
         return Response(serializer.errors, status=400)
 
 
+# ✅ ACTUALIZAR UBICACIÓN CON UN LOTE DE MUESTRAS
+# Para conductores con mala conexión: una sola petición con todas las muestras
+# acumuladas; al buffer sólo llega la más reciente.
+class UpdateDriverLocationBatchView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = DriverLocationBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        conductor = location_buffer.driver_for_user(request.user.id)
+        if conductor is None:
+            return Response({'error': 'Este usuario no es un conductor.'}, status=400)
+        driver_id, is_approved = conductor
+
+        muestras = serializer.validated_data['samples']
+        trip_id = serializer.validated_data.get('trip')
+        guardadas = 0
+        if trip_id is not None:
+            activo = Trip.objects.filter(
+                id=trip_id, driver_id=driver_id, status__in=['assigned', 'in_progress']
+            ).exists()
+            if not activo:
+                return Response({'error': 'El viaje no está activo para este conductor.'}, status=400)
+            guardadas = append_points(trip_id, muestras)
+
+        ts, lat, lng = muestras[-1]
+        actualizada = location_buffer.ingest(driver_id, lat, lng, timestamp=ts, is_approved=is_approved)
+        return Response({
+            'message': 'Ubicaciones recibidas correctamente',
+            'received': len(muestras),
+            'latest_applied': actualizada,
+            'trail_appended': guardadas,
+        })
+
+
+# ✅ RECORRIDO GPS DE UN VIAJE (?since=&until= en epoch segundos)
+class TripTrailView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, trip_id):
+        trip = get_object_or_404(
+            Trip.objects.select_related('passenger', 'driver').only('passenger__user_id', 'driver__user_id'),
+            id=trip_id,
+        )
+        participantes = {trip.passenger.user_id, trip.driver.user_id if trip.driver else None}
+        if request.user.id not in participantes and not request.user.is_staff:
+            return Response({'error': 'No tienes acceso a este viaje.'}, status=403)
+
+        try:
+            since = request.query_params.get('since')
+            until = request.query_params.get('until')
+            since = int(since) if since is not None else None
+            until = int(until) if until is not None else None
+        except ValueError:
+            return Response({'error': 'Parámetros since o until inválidos.'}, status=400)
+
+        return Response({
+            'trip': trip.id,
+            'points': [[ts, lat, lng] for ts, lat, lng in read_points(trip.id, since=since, until=until)],
+        })
+
+
+# ✅ CONDUCTORES CERCANOS AL ORIGEN DE UN VIAJE
+class NearbyDriversView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, trip_id):
+        trip = get_object_or_404(
+            Trip.objects.only('origin_lat', 'origin_lng', 'passenger_id', 'driver_id'), id=trip_id,
+        )
+        # Posiciones en vivo: sólo para el pasajero o el conductor del viaje.
+        es_participante = (
+            trip.passenger_id == request.user.passenger_id
+            or (trip.driver_id is not None and trip.driver_id == request.user.driver_id)
+        )
+        if not es_participante and not request.user.is_staff:
+            return Response({'error': 'No tienes acceso a este viaje.'}, status=403)
+
+        try:
+            k = max(1, min(int(request.query_params.get('k', 5)), 50))
+            radius_km = request.query_params.get('radius_km')
+            radius_km = float(radius_km) if radius_km is not None else None
+        except ValueError:
+            return Response({'error': 'Parámetros k o radius_km inválidos.'}, status=400)
+        if radius_km is not None and not (math.isfinite(radius_km) and radius_km > 0):
+            return Response({'error': 'radius_km debe ser un número positivo.'}, status=400)
+
+        cercanos = nearest_drivers(trip.origin_lat, trip.origin_lng, k=k, radius_km=radius_km)
+        return Response({
+            'trip': trip.id,
+            'drivers': [
+                {'driver_id': driver_id, 'distance_km': round(dist, 3), 'lat': lat, 'lng': lng}
+                for driver_id, dist, lat, lng in cercanos
+            ],
+        })
+
+
+# ✅ COTIZAR TARIFA SIN CREAR EL VIAJE
+class FareQuoteView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        lote = 'quotes' in request.data
+        serializer = (FareQuoteBatchSerializer if lote else FareQuoteSerializer)(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        rutas = serializer.validated_data['quotes'] if lote else [serializer.validated_data]
+        cotizaciones = quote_fares([
+            (r['origin_lat'], r['origin_lng'], r['destination_lat'], r['destination_lng']) for r in rutas
+        ])
+        resultados = FareQuoteResultSerializer(
+            [{'fare': fare, 'distance_km': distancia} for fare, distancia in cotizaciones], many=True
+        ).data
+        return Response({'quotes': resultados} if lote else resultados[0])
+
+
+# ✅ HISTORIAL DE GANANCIAS POR PERIODO (?period=day|week&limit=12)
+class EarningPeriodsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        period = request.query_params.get('period', 'week')
+        if period not in PERIODOS:
+            return Response({'error': 'Periodo inválido. Usa day o week.'}, status=400)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 12)), 366))
+        except ValueError:
+            return Response({'error': 'Parámetro limit inválido.'}, status=400)
+        return Response({
+            'period': period,
+            'results': period_history(request.user.id, period=period, limit=limit),
+        })
+
+
+# ✅ ASIGNAR UNA PROMOCIÓN A MUCHOS USUARIOS (sólo staff, sin señales por fila)
+class PromotionAwardView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, promotion_id):
+        promotion = get_object_or_404(Promotion, id=promotion_id)
+        serializer = PromotionAwardSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        User = get_user_model()
+        user_ids = list(User.objects.filter(pk__in=serializer.validated_data['users']).values_list('pk', flat=True))
+        awarded = award_promotion_bulk(promotion, user_ids, notes="Asignada en lote por un administrador")
+        return Response({'awarded': awarded, 'skipped': len(serializer.validated_data['users']) - awarded})
+
+
+# ✅ RED DE REFERIDOS DEL USUARIO
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def referral_summary_view(request):
+    return Response({
+        'direct': direct_referral_count(request.user.id),
+        'network': subtree_size(request.user.id),
+    })
+
+
+# ✅ RANKING DE REFERIDORES (?limit=10&depth=1)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def top_referrers_view(request):
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 10)), 100))
+        depth = max(1, min(int(request.query_params.get('depth', 1)), 10))
+    except ValueError:
+        return Response({'error': 'Parámetros limit/depth inválidos.'}, status=400)
+    resultados = [
+        {'user': fila['ancestor_id'], 'username': fila['ancestor__username'], 'referrals': fila['referrals']}
+        for fila in top_referrers(limit=limit, depth=depth)
+    ]
+    return Response({'depth': depth, 'results': resultados})
+
+
+# ✅ POLÍTICAS VIGENTES (al abrir la app, sin autenticación)
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def current_policy_view(request):
+    policy = get_current_policy()
+    if policy is None:
+        return Response({'error': 'No hay políticas publicadas.'}, status=404)
+    return Response(policy)
+
+
+# ✅ PROMOCIONES ACTIVAS (por defecto, las del rol del usuario)
+GRUPO_POR_ROL = {'conductor': 'conductor', 'pasajero': 'usuario'}
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def active_promotions_view(request):
+    target_group = request.query_params.get('target_group') or GRUPO_POR_ROL.get(request.user.role)
+    try:
+        promociones = get_active_promotions(target_group)
+    except ValueError:
+        return Response({'error': 'target_group debe ser conductor o usuario.'}, status=400)
+    return Response({'target_group': target_group, 'results': promociones})
+
+
+# ✅ MÉTRICAS DE LAS CACHÉS (sólo staff)
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def cache_stats_view(request):
+    return Response(cache_stats())
+
+
+def _viaje_del_participante(request, trip_id):
+    # 404 también para quien no es pasajero ni conductor: no revela qué viajes existen.
+    return get_object_or_404(Trip.objects.filter(participant_q(request.user.id)), id=trip_id)
+
+
 # ✅ ENVIAR MENSAJE EN CHAT DEL VIAJE
 class SendChatMessageView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, trip_id):
-        trip = get_object_or_404(Trip, id=trip_id)
+        trip = _viaje_del_participante(request, trip_id)
         message_text = request.data.get('message')
 
         if not message_text:
@@ -195,7 +440,7 @@ class SendChatMessageView(APIView):
 
         message = ChatMessage.objects.create(
             trip=trip,
-            sender=request.user,
+            sender=request.user.user,
             message=message_text
         )
         serializer = ChatMessageSerializer(message)
@@ -206,22 +451,23 @@ class SendChatMessageView(APIView):
 class TripChatMessagesView(generics.ListAPIView):
     serializer_class = ChatMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ChatMessagePagination
 
     def get_queryset(self):
-        trip_id = self.kwargs['trip_id']
-        return ChatMessage.objects.filter(trip__id=trip_id).order_by('timestamp')
+        trip = _viaje_del_participante(self.request, self.kwargs['trip_id'])
+        return ChatMessage.objects.filter(trip=trip).select_related('sender').order_by('timestamp')
 
 
 # ✅ LISTA Y CREA MENSAJES EN UNA SOLA VISTA
 class ChatMessageListCreateView(generics.ListCreateAPIView):
     serializer_class = ChatMessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ChatMessagePagination
 
     def get_queryset(self):
-        trip_id = self.kwargs['trip_id']
-        return ChatMessage.objects.filter(trip_id=trip_id).order_by('timestamp')
+        trip = _viaje_del_participante(self.request, self.kwargs['trip_id'])
+        return ChatMessage.objects.filter(trip=trip).select_related('sender').order_by('timestamp')
 
     def perform_create(self, serializer):
-        trip_id = self.kwargs['trip_id']
-        trip = Trip.objects.get(id=trip_id)
-        serializer.save(sender=self.request.user, trip=trip)
+        trip = _viaje_del_participante(self.request, self.kwargs['trip_id'])
+        serializer.save(sender=self.request.user.user, trip=trip)
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from rest_framework.exceptions import AuthenticationFailed
+
+from .models import ChatMessage
+from .realtime import get_broker, token_from_scope, trip_for_participant, user_from_token
+
+# ✅ CHAT EN TIEMPO REAL POR WEBSOCKET
+#
+# ws(s)://<host>/ws/chats/<trip_id>/?token=<access>
+# El cliente envía {"message": "..."}; todos los participantes conectados al
+# viaje (incluido quien envía) reciben el ChatMessage serializado.
+# Sólo existe bajo ASGI (SERVER_MODE=asgi, ver backend/asgi.py): con el modo
+# por defecto, WSGI, no hay ruta WebSocket y el cliente debe usar
+# /api/chats/<trip_id>/ por HTTP.
+
+CHAT_PATH = re.compile(r'^/ws/chats/(?P<trip_id>\d+)/?$')
+
+
+def _crear_mensaje_sync(trip_id, user, text):
+    close_old_connections()
+    return ChatMessage.objects.create(trip_id=trip_id, sender=user.user, message=text)
+
+
+crear_mensaje = sync_to_async(_crear_mensaje_sync)
+
+
+async def _rechazar(send, code):
+    await send({'type': 'websocket.close', 'code': code})
+
+
+async def websocket_application(scope, receive, send):
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    match = CHAT_PATH.match(scope['path'])
+    if match is None:
+        return await _rechazar(send, 4404)
+    trip_id = int(match.group('trip_id'))
+
+    token = token_from_scope(scope)
+    user = await user_from_token(token) if token else None
+    if user is None:
+        return await _rechazar(send, 4401)
+    if await trip_for_participant(trip_id, user.id) is None:
+        return await _rechazar(send, 4403)
+
+    await send({'type': 'websocket.accept'})
+    subscription = get_broker().subscribe(f'chat.{trip_id}')
+
+    async def reenviar():
+        async for _, message in subscription:
+            await send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    tarea = asyncio.create_task(reenviar())
+    try:
+        while True:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                break
+            if event['type'] != 'websocket.receive':
+                continue
+            try:
+                text = json.loads(event.get('text') or '{}').get('message')
+            except (ValueError, AttributeError):
+                text = None
+            if not text:
+                await send({'type': 'websocket.send', 'text': json.dumps({'error': 'Mensaje vacío'})})
+                continue
+            # El post_save de ChatMessage publica el mensaje a todos los suscriptores.
+            try:
+                await crear_mensaje(trip_id, user, text)
+            except AuthenticationFailed:
+                # El usuario se borró o desactivó con la conexión abierta.
+                await _rechazar(send, 4401)
+                break
+    finally:
+        tarea.cancel()
+        subscription.close()